@@ -0,0 +1,49 @@
+from datetime import datetime
+
+from sqlalchemy import case, func, or_, select, update
+
+import models
+
+# Денормализованная статистика откликов на заказе (bid_count, min_bid, max_bid, avg_bid):
+# лента показывает уровень конкуренции без подсчета откликов в каждом запросе
+
+
+def record_bid(db, order_id: int, amount: float) -> int:
+    """
+    Учитывает новый отклик в статистике заказа. Вызывается в той же транзакции,
+    что и вставка отклика; возвращает новое число откликов на заказ
+    """
+    order = models.Order
+    stmt = (
+        update(order)
+        .where(order.id == order_id)
+        .values(
+            bid_count=order.bid_count + 1,
+            min_bid=case((or_(order.min_bid.is_(None), order.min_bid > amount), amount), else_=order.min_bid),
+            max_bid=case((or_(order.max_bid.is_(None), order.max_bid < amount), amount), else_=order.max_bid),
+            avg_bid=(func.coalesce(order.avg_bid, 0) * order.bid_count + amount) / (order.bid_count + 1),
+            updated_at=datetime.utcnow(),
+        )
+        .returning(order.bid_count)
+        .execution_options(synchronize_session=False)
+    )
+    return db.execute(stmt).scalar_one()
+
+
+def rebuild(db) -> None:
+    """Полный пересчет статистики по таблице откликов (после миграции или загрузки данных)"""
+    bids = models.Bid
+
+    def per_order(aggregate):
+        return select(aggregate).where(bids.order_id == models.Order.id).scalar_subquery()
+
+    db.execute(
+        update(models.Order)
+        .values(
+            bid_count=per_order(func.count(bids.id)),
+            min_bid=per_order(func.min(bids.amount)),
+            max_bid=per_order(func.max(bids.amount)),
+            avg_bid=per_order(func.avg(bids.amount)),
+        )
+        .execution_options(synchronize_session=False)
+    )
@@ -6,6 +6,8 @@ from sqlalchemy.orm import Session
 from database import engine, SessionLocal
 import models
 import auth
+import bid_stats
+import facets
 from datetime import datetime, timedelta
 
 def create_test_data():
@@ -133,6 +135,10 @@ def create_test_data():
         accepted_order.freelancer_id = test_freelancer.id
         accepted_order.status = "in_progress"
         
+        db.flush()
+        bid_stats.rebuild(db)
+        # Счетчики категорий могли остаться от прежних данных - пересчитываем по заказам
+        facets.rebuild(db)
         db.commit()
         
         print(f"Создано {len(orders)} тестовых заказов")
@@ -0,0 +1,110 @@
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import case, func
+from sqlalchemy.dialects import postgresql, sqlite
+
+import models
+
+# Границы корзин гистограммы бюджета (руб.)
+BUDGET_BUCKETS = [0, 1000, 5000, 10000, 50000]
+
+
+def _bucket_labels() -> List[str]:
+    uppers = BUDGET_BUCKETS[1:] + [None]
+    return [f"{lower}-{upper}" if upper is not None else f"{lower}+"
+            for lower, upper in zip(BUDGET_BUCKETS, uppers)]
+
+
+def budget_bucket(budget: Optional[float]) -> Optional[str]:
+    if budget is None or budget < BUDGET_BUCKETS[0]:
+        return None
+    label = None
+    for lower, bucket in zip(BUDGET_BUCKETS, _bucket_labels()):
+        if budget >= lower:
+            label = bucket
+    return label
+
+
+def _facet_values(order: models.Order) -> List[tuple]:
+    values = []
+    if order.category:
+        values.append(("category", order.category))
+    bucket = budget_bucket(order.budget)
+    if bucket:
+        values.append(("budget", bucket))
+    return values
+
+
+def _bump(db, facet: str, value: str, delta: int) -> None:
+    dialect = db.get_bind().dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    table = models.FacetCount.__table__
+    stmt = insert(table).values(facet=facet, value=value, open_orders=max(delta, 0))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.facet, table.c.value],
+        set_={"open_orders": table.c.open_orders + delta},
+    )
+    db.execute(stmt)
+
+
+def order_opened(db, order: models.Order) -> None:
+    """Заказ появился в ленте открытых. Вызывается в той же транзакции, что и запись заказа"""
+    orders_opened(db, [order])
+
+
+def orders_opened(db, orders: Iterable[models.Order]) -> None:
+    """Пакетный вариант order_opened: один UPSERT на значение фасета, а не на заказ"""
+    deltas = Counter(pair for order in orders for pair in _facet_values(order))
+    for (facet, value), delta in deltas.items():
+        _bump(db, facet, value, delta)
+
+
+def order_closed(db, order: models.Order) -> None:
+    """Заказ ушел из открытых (принят отклик или отменен)"""
+    for facet, value in _facet_values(order):
+        _bump(db, facet, value, -1)
+
+
+def rebuild(db) -> None:
+    """Полный пересчет счетчиков по таблице заказов"""
+    db.query(models.FacetCount).delete()
+    is_open = func.sum(case((models.Order.status == "open", 1), else_=0))
+    rows = db.query(models.Order.category, is_open).filter(
+        models.Order.category.isnot(None),
+        models.Order.category != ''
+    ).group_by(models.Order.category).all()
+    for category, open_orders in rows:
+        db.add(models.FacetCount(facet="category", value=category, open_orders=open_orders or 0))
+
+    buckets: Dict[str, int] = {}
+    for (budget,) in db.query(models.Order.budget).filter(models.Order.status == "open"):
+        bucket = budget_bucket(budget)
+        if bucket:
+            buckets[bucket] = buckets.get(bucket, 0) + 1
+    for bucket, open_orders in buckets.items():
+        db.add(models.FacetCount(facet="budget", value=bucket, open_orders=open_orders))
+    db.commit()
+
+
+def ensure_built(db) -> None:
+    """При первом запуске (или после init_db) заполняет пустую таблицу счетчиков"""
+    if db.query(models.FacetCount).first() is None and db.query(models.Order.id).first() is not None:
+        print("📊 Пересчет счетчиков категорий...")
+        rebuild(db)
+
+
+def category_counts(db) -> List[models.FacetCount]:
+    return db.query(models.FacetCount).filter(
+        models.FacetCount.facet == "category"
+    ).order_by(models.FacetCount.value).all()
+
+
+def get_facets(db) -> dict:
+    """Блок facets для ответа поиска: число открытых заказов по категориям и бюджету"""
+    rows = db.query(models.FacetCount).order_by(models.FacetCount.value).all()
+    budget = {row.value: row.open_orders for row in rows if row.facet == "budget"}
+    return {
+        "categories": {row.value: row.open_orders for row in rows if row.facet == "category"},
+        "budget": {label: budget.get(label, 0) for label in _bucket_labels()},
+    }
@@ -0,0 +1,71 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import order_events
+
+# Сколько первых страниц ленты фрилансера держим в памяти
+FEED_CACHED_PAGES = 5
+# Страховочный TTL: другие воркеры узнают об изменениях не позже этого срока
+FEED_CACHE_TTL_SECONDS = 30
+
+
+class FeedCache:
+    """
+    Общий кэш первых страниц ленты открытых заказов. Лента одинакова для всех
+    фрилансеров, поэтому храним уже сериализованный JSON и отдаем его как есть.
+    """
+
+    def __init__(self, ttl: float = FEED_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._pages: Dict[Tuple, Tuple[float, bytes, Tuple[int, ...]]] = {}
+        self._version = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_cacheable(page: int, limit: int, cursor: Optional[str]) -> bool:
+        if cursor is not None:
+            return cursor == ""
+        return page <= FEED_CACHED_PAGES
+
+    def get(self, key: Tuple) -> Optional[Tuple[bytes, Tuple[int, ...]]]:
+        """Готовое тело страницы и id заказов на ней (для счетчика показов)"""
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is None:
+                return None
+            stored_at, body, order_ids = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._pages[key]
+                return None
+            return body, order_ids
+
+    def version(self) -> int:
+        return self._version
+
+    def put(self, key: Tuple, body: bytes, version: int, order_ids: Tuple[int, ...] = ()) -> None:
+        with self._lock:
+            # Пока страница строилась, лента могла измениться - такую не сохраняем
+            if version != self._version:
+                return
+            self._pages[key] = (time.monotonic(), body, order_ids)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._version += 1
+            self._pages.clear()
+
+
+feed_cache = FeedCache()
+
+
+@order_events.subscribe(
+    order_events.ORDER_CREATED,
+    order_events.ORDER_PROMOTED,
+    order_events.ORDER_ACCEPTED,
+    order_events.ORDER_CANCELLED,
+    order_events.ORDER_DEMOTED,
+    order_events.ORDER_BID_PLACED,
+)
+def _invalidate_feed(event, order):
+    feed_cache.invalidate()
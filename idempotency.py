@@ -0,0 +1,197 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from jose import JWTError, jwt
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+import auth
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+# Сколько хранить ответ для повтора и сколько ключей держать в памяти
+IDEMPOTENCY_TTL_SECONDS = 24 * 60 * 60
+IDEMPOTENCY_MAX_KEYS = 10000
+MAX_KEY_LENGTH = 255
+
+# POST-эндпоинты, которые мобильные клиенты повторяют по таймауту
+IDEMPOTENT_PATHS = [
+    re.compile(r"^/orders$"),
+    re.compile(r"^/orders/bulk$"),
+    re.compile(r"^/orders/promoted$"),
+    re.compile(r"^/bids$"),
+    re.compile(r"^/orders/\d+/messages$"),
+    re.compile(r"^/reviews$"),
+]
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "expires_at", "status", "headers", "body", "done")
+
+    def __init__(self, fingerprint: str, expires_at: float):
+        self.fingerprint = fingerprint
+        self.expires_at = expires_at
+        self.status = 0
+        self.headers: List[Tuple[bytes, bytes]] = []
+        self.body = b""
+        self.done = False
+
+
+class IdempotencyStore:
+    """Ограниченное по размеру хранилище ответов с TTL (LRU-вытеснение)"""
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL_SECONDS, max_keys: int = IDEMPOTENCY_MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def begin(self, key: tuple, fingerprint: str) -> Tuple[Optional[_Entry], bool]:
+        """
+        Возвращает (запись, новая ли она). Новую запись вызывающий заполняет через
+        finish() или снимает через discard(), если ответ сохранять не нужно
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry, False
+            entry = _Entry(fingerprint, now + self.ttl)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+            return entry, True
+
+    def finish(self, entry: _Entry, status: int, headers: list, body: bytes) -> None:
+        with self._lock:
+            entry.status = status
+            entry.headers = headers
+            entry.body = body
+            entry.done = True
+
+    def discard(self, key: tuple) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+idempotency_store = IdempotencyStore()
+
+
+def _user_scope(headers: Headers) -> Optional[str]:
+    """Ключи у каждого пользователя свои: берем sub из токена"""
+    authorization = headers.get("authorization", "")
+    if not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        payload = jwt.decode(authorization[7:], auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub")
+
+
+class IdempotencyMiddleware:
+    """
+    Поддержка заголовка Idempotency-Key: повтор запроса с тем же ключом получает
+    сохраненный ответ, обработчик второй раз не выполняется. Ответы 5xx не
+    сохраняются - такой запрос можно повторить.
+    """
+
+    def __init__(self, app: ASGIApp, store: IdempotencyStore = idempotency_store):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST" \
+                or not any(p.match(scope["path"]) for p in IDEMPOTENT_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get(IDEMPOTENCY_HEADER)
+        user = _user_scope(headers)
+        if not idempotency_key or user is None:
+            # Без ключа или без авторизации - обычная обработка (401 вернет сам эндпоинт)
+            await self.app(scope, receive, send)
+            return
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            await JSONResponse({"detail": "Idempotency-Key is too long"}, status_code=400)(scope, receive, send)
+            return
+
+        # Тело читаем целиком: по нему и строке запроса (например, is_urgent у /orders/promoted)
+        # проверяем, что ключ не переиспользован для другого запроса
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+        fingerprint = hashlib.sha256(
+            scope["path"].encode() + b"?" + scope.get("query_string", b"") + b"\n" + body
+        ).hexdigest()
+
+        key = (user, idempotency_key)
+        entry, is_new = self.store.begin(key, fingerprint)
+        if not is_new:
+            if entry.fingerprint != fingerprint:
+                response = JSONResponse(
+                    {"detail": "Idempotency-Key was already used with a different request"},
+                    status_code=422
+                )
+            elif not entry.done:
+                response = JSONResponse(
+                    {"detail": "A request with this Idempotency-Key is still in progress"},
+                    status_code=409
+                )
+            else:
+                await send({
+                    "type": "http.response.start",
+                    "status": entry.status,
+                    "headers": entry.headers + [(b"idempotent-replayed", b"true")],
+                })
+                await send({"type": "http.response.body", "body": entry.body})
+                return
+            await response(scope, receive, send)
+            return
+
+        body_sent = False
+
+        async def replay_receive() -> Message:
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        status = 0
+        response_headers: list = []
+        chunks: List[bytes] = []
+
+        async def capture_send(message: Message) -> None:
+            nonlocal status, response_headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                # Сохраняем до отправки последнего куска: клиент может повторить
+                # запрос сразу после получения ответа
+                if not message.get("more_body", False) and status < 500:
+                    self.store.finish(entry, status, response_headers, b"".join(chunks))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            if not entry.done:
+                self.store.discard(key)
+            raise
+        if not entry.done:
+            self.store.discard(key)
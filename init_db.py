@@ -6,6 +6,7 @@ from sqlalchemy.orm import Session
 from database import engine, SessionLocal, Base
 import models
 import auth
+import search_index
 
 def init_database():
     """Инициализация базы данных с тестовыми данными"""
@@ -15,6 +16,7 @@ def init_database():
     # Удаляем старые таблицы и создаем новые
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
+    search_index.setup_search_index(engine, rebuild=True)
     
     db = SessionLocal()
     
@@ -0,0 +1,141 @@
+import asyncio
+import heapq
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+
+import models
+from database import SessionLocal
+
+# Сколько фрилансеров держим в каждом топе и как часто пересчитываем рейтинг
+LEADERBOARD_TOP_K = 50
+LEADERBOARD_REFRESH_SECONDS = 300
+# Вес априорной оценки (в отзывах): один отзыв 5/5 не поднимает фрилансера на вершину
+BAYES_PRIOR_REVIEWS = 5
+
+
+def bayesian_score(rating_sum: float, review_count: int, prior_mean: float,
+                   prior_reviews: int = BAYES_PRIOR_REVIEWS) -> float:
+    """Байесовское среднее: оценка стягивается к средней по площадке, пока отзывов мало"""
+    return (prior_mean * prior_reviews + rating_sum) / (prior_reviews + review_count)
+
+
+class Leaderboard:
+    """
+    Топ фрилансеров по байесовскому рейтингу: общий и по категориям завершенных
+    заказов. Пересчитывается фоновой задачей, запросы читают готовые списки из памяти.
+    """
+
+    def __init__(self, top_k: int = LEADERBOARD_TOP_K,
+                 refresh_interval: float = LEADERBOARD_REFRESH_SECONDS):
+        self.top_k = top_k
+        self.refresh_interval = refresh_interval
+        self._tops: Dict[Optional[str], List[dict]] = {}
+        self._refreshed_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def is_warm(self) -> bool:
+        return (self._refreshed_at is not None
+                and time.monotonic() - self._refreshed_at < self.refresh_interval * 2)
+
+    def refresh(self, db) -> None:
+        # Средняя оценка по площадке - априорное значение для всех фрилансеров
+        prior_mean = db.query(func.avg(models.Review.rating)).join(
+            models.User, models.User.id == models.Review.reviewed_user_id
+        ).filter(models.User.is_freelancer == True).scalar() or 0
+
+        completed = dict(db.query(
+            models.Order.freelancer_id, func.count(models.Order.id)
+        ).filter(
+            models.Order.status == "completed",
+            models.Order.freelancer_id.isnot(None)
+        ).group_by(models.Order.freelancer_id).all())
+
+        # Общий топ - по агрегатам отзывов, которые хранятся на пользователе
+        freelancers = db.query(
+            models.User.id, models.User.full_name, models.User.rating_sum, models.User.review_count
+        ).filter(
+            models.User.is_freelancer == True,
+            models.User.is_active == True,
+            models.User.review_count > 0
+        ).all()
+        names = {user.id: user.full_name for user in freelancers}
+        tops = {None: self._top([
+            self._entry(user.id, user.full_name, user.rating_sum, user.review_count,
+                        completed.get(user.id, 0), prior_mean)
+            for user in freelancers
+        ])}
+
+        # Топы по категориям - отзывы клиентов по завершенным заказам этой категории
+        rows = db.query(
+            models.Review.reviewed_user_id,
+            models.Order.category,
+            func.sum(models.Review.rating),
+            func.count(models.Review.id)
+        ).join(
+            models.Order, models.Order.id == models.Review.order_id
+        ).filter(
+            models.Order.status == "completed",
+            models.Order.freelancer_id == models.Review.reviewed_user_id,
+            models.Order.category.isnot(None)
+        ).group_by(models.Review.reviewed_user_id, models.Order.category).all()
+
+        per_category: Dict[str, List[dict]] = {}
+        for user_id, category, rating_sum, review_count in rows:
+            if user_id not in names:
+                continue
+            per_category.setdefault(category, []).append(self._entry(
+                user_id, names[user_id], rating_sum, review_count,
+                completed.get(user_id, 0), prior_mean
+            ))
+        for category, entries in per_category.items():
+            tops[category] = self._top(entries)
+
+        with self._lock:
+            self._tops = tops
+            self._refreshed_at = time.monotonic()
+
+    @staticmethod
+    def _entry(user_id: int, full_name: str, rating_sum: float, review_count: int,
+               completed_orders: int, prior_mean: float) -> dict:
+        return {
+            "user_id": user_id,
+            "full_name": full_name,
+            "score": round(bayesian_score(rating_sum, review_count, prior_mean), 3),
+            "rating": round(rating_sum / review_count, 2),
+            "review_count": review_count,
+            "completed_orders": completed_orders,
+        }
+
+    def _top(self, entries: List[dict]) -> List[dict]:
+        return heapq.nlargest(
+            self.top_k, entries, key=lambda e: (e["score"], e["review_count"], -e["user_id"])
+        )
+
+    def top(self, category: Optional[str] = None, limit: int = 20) -> List[dict]:
+        with self._lock:
+            return self._tops.get(category, [])[:limit]
+
+
+leaderboard = Leaderboard()
+
+
+def _refresh_once() -> None:
+    db = SessionLocal()
+    try:
+        leaderboard.refresh(db)
+    finally:
+        db.close()
+
+
+async def run_leaderboard_refresher(interval: float = LEADERBOARD_REFRESH_SECONDS):
+    """Фоновая задача: периодически пересчитывает топ фрилансеров"""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, _refresh_once)
+        except Exception as e:
+            print(f"Error in leaderboard refresher: {e}")
+        await asyncio.sleep(interval)
@@ -1,23 +1,57 @@
 import asyncio
-from fastapi import FastAPI, Depends, HTTPException, status, WebSocket, WebSocketDisconnect, Query
+from fastapi import FastAPI, Depends, HTTPException, status, WebSocket, WebSocketDisconnect, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy import func, or_, and_
-from sqlalchemy.orm import Session
-from typing import Dict, List, Optional, Set
+from sqlalchemy import func, and_, insert, update
+from sqlalchemy.orm import Session, load_only
+from typing import Dict, List, Optional, Set, Union
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.exc import IntegrityError
 import json
 import models
 import auth
 from database import engine, get_db, SessionLocal
+from pagination import decode_cursor, encode_cursor, paginate_keyset
+import migrations
+import search_index
+import order_events
+import facets
+import bid_stats
+import rating_stats
+import user_stats
+import http_cache
+import tagged_cache
+from tagged_cache import model_tag
+from compression import CompressionMiddleware, json_array_stream
+from idempotency import IdempotencyMiddleware
+from serialization import FastJSONResponse, cached_serializer, compile_serializer, dumps, parse_fields
+import promotions
+import saved_searches
+from feed_cache import feed_cache
+from order_counters import order_counters, run_counter_flusher
+from urgent_index import urgent_index
+from leaderboard import LEADERBOARD_TOP_K, leaderboard, run_leaderboard_refresher
 import traceback
 
 # Создаем таблицы
 models.Base.metadata.create_all(bind=engine)
+migrations.run_migrations(engine)
+# Индексы, которые не удалось создать: без уникальных дубликаты проверяются запросом
+MISSING_INDEXES = migrations.missing_indexes(engine)
+search_index.setup_search_index(engine)
+with SessionLocal() as startup_db:
+    facets.ensure_built(startup_db)
+# Кэш ответов сбрасывается по тегам строк, измененных закоммиченной транзакцией
+tagged_cache.install(SessionLocal, models.Base)
 
-app = FastAPI(title="ВРаботе API", version="1.0.0")
+app = FastAPI(title="ВРаботе API", version="1.0.0", default_response_class=FastJSONResponse)
+
+# Повторы POST с заголовком Idempotency-Key получают сохраненный ответ
+# (внутренний слой: сохраняется несжатый ответ, CORS и сжатие применяются и к повтору)
+app.add_middleware(IdempotencyMiddleware)
 
 # Настройка CORS
 app.add_middleware(
@@ -35,9 +69,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Сжатие больших JSON-ответов (gzip, brotli при наличии модуля)
+app.add_middleware(CompressionMiddleware)
+
 # Схема OAuth2
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Фоновые задачи
+background_tasks: Set[asyncio.Task] = set()
+
+@app.on_event("startup")
+async def start_background_tasks():
+    background_tasks.add(asyncio.create_task(promotions.run_promotion_sweeper()))
+    background_tasks.add(asyncio.create_task(run_counter_flusher()))
+    background_tasks.add(asyncio.create_task(run_leaderboard_refresher()))
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    for task in background_tasks:
+        task.cancel()
+    # Не теряем накопленные просмотры и показы при штатной остановке
+    try:
+        order_counters.flush()
+    except Exception as e:
+        print(f"Error flushing order counters: {e}")
+
 # WebSocket менеджер
 class ConnectionManager:
     def __init__(self):
@@ -94,10 +150,54 @@ class OrderResponse(BaseModel):
     deadline: Optional[datetime] = None
     freelancer_id: Optional[int] = None
     category: Optional[str] = None
+    is_premium: bool = False
+    is_urgent: bool = False
+    is_promoted: bool = False
+    promoted_until: Optional[datetime] = None
+    view_count: int = 0
+    impression_count: int = 0
+    bid_count: int = 0
+    min_bid: Optional[float] = None
+    max_bid: Optional[float] = None
+    avg_bid: Optional[float] = None
 
     class Config:
         from_attributes = True
 
+# Быстрые сериализаторы для списков: ORM -> dict без повторной валидации
+serialize_order = compile_serializer(OrderResponse.model_fields)
+serialize_order_dict = compile_serializer(OrderResponse.model_fields, from_dict=True)
+ORDER_FIELDS = tuple(OrderResponse.model_fields)
+
+# Разбор параметра fields= для списков заказов
+def parse_order_fields(fields: Optional[str]):
+    try:
+        return parse_fields(fields, ORDER_FIELDS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Загружаем из БД только запрошенные колонки (большие Text-поля не читаются),
+# плюс колонки, нужные для сортировки и курсора
+def select_order_fields(query, selected, *required):
+    if selected is None:
+        return query
+    names = set(selected) | {column.key for column in required}
+    return query.options(load_only(*[getattr(models.Order, name) for name in names]))
+
+def order_serializer(selected):
+    return serialize_order if selected is None else cached_serializer(selected)
+
+class OrderPage(BaseModel):
+    items: List[OrderResponse]
+    next_cursor: Optional[str] = None
+
+class OrderSearchPage(OrderPage):
+    facets: Optional[dict] = None
+
+class CategoryCount(BaseModel):
+    category: str
+    open_orders: int
+
 class BidCreate(BaseModel):
     order_id: int
     amount: float
@@ -119,6 +219,12 @@ class BidResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class BidPage(BaseModel):
+    items: List[BidResponse]
+    next_cursor: Optional[str] = None
+
+BID_STATUSES = ("pending", "accepted", "rejected")
+
 class ChatMessageCreate(BaseModel):
     message: str
     message_type: str = "text"
@@ -131,6 +237,24 @@ class ReviewCreate(BaseModel):
 class ReviewReply(BaseModel):
     reply_text: str
 
+class ReviewResponse(BaseModel):
+    id: int
+    rating: int
+    comment: Optional[str] = None
+    reply: Optional[str] = None
+    reviewer_name: Optional[str] = None
+    reviewer_id: int
+    order_title: Optional[str] = None
+    order_id: int
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+class ReviewPage(BaseModel):
+    items: List[ReviewResponse]
+    next_cursor: Optional[str] = None
+
+serialize_review = compile_serializer(ReviewResponse.model_fields)
+
 class NotificationResponse(BaseModel):
     id: int
     title: str
@@ -143,6 +267,25 @@ class NotificationResponse(BaseModel):
     class Config:
         from_attributes = True
 
+serialize_notification = compile_serializer(NotificationResponse.model_fields)
+
+class SavedSearchCreate(BaseModel):
+    query: Optional[str] = None
+    category: Optional[str] = None
+    min_budget: Optional[float] = None
+    max_budget: Optional[float] = None
+
+class SavedSearchResponse(BaseModel):
+    id: int
+    query: Optional[str]
+    category: Optional[str]
+    min_budget: Optional[float]
+    max_budget: Optional[float]
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
 # Вспомогательная функция для получения текущего пользователя
 async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
@@ -175,6 +318,59 @@ def create_notification(db: Session, user_id: int, title: str, body: str, notif_
     db.add(notification)
     return notification
 
+# Максимум id в одном batch-запросе
+MAX_BATCH_IDS = 200
+
+# Разбор списка id вида "1,2,3" для batch-эндпоинтов
+def parse_id_list(ids: str) -> List[int]:
+    try:
+        result = list(dict.fromkeys(int(part) for part in ids.split(",") if part.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    if not result:
+        raise HTTPException(status_code=400, detail="ids must not be empty")
+    if len(result) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"Too many ids (max {MAX_BATCH_IDS})")
+    return result
+
+# Максимум заказов в одном bulk-запросе
+MAX_BULK_ORDERS = 500
+
+# Разбор тела bulk-запроса: JSON-массив или NDJSON (по заказу на строку).
+# Возвращает список (OrderCreate или None, ошибки или None) в исходном порядке
+def parse_bulk_orders(body: bytes, content_type: str) -> List[tuple]:
+    try:
+        if "ndjson" in content_type or "jsonl" in content_type:
+            raw_items = []
+            for line in body.decode("utf-8").splitlines():
+                if not line.strip():
+                    continue
+                try:
+                    raw_items.append(json.loads(line))
+                except ValueError:
+                    raw_items.append(ValueError("Invalid JSON line"))
+        else:
+            raw_items = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    if not isinstance(raw_items, list):
+        raise HTTPException(status_code=400, detail="Expected a list of orders")
+    if not raw_items:
+        raise HTTPException(status_code=400, detail="No orders to create")
+    if len(raw_items) > MAX_BULK_ORDERS:
+        raise HTTPException(status_code=400, detail=f"Too many orders (max {MAX_BULK_ORDERS})")
+    
+    parsed = []
+    for raw in raw_items:
+        if isinstance(raw, ValueError):
+            parsed.append((None, [{"msg": str(raw)}]))
+            continue
+        try:
+            parsed.append((OrderCreate.model_validate(raw), None))
+        except ValidationError as e:
+            parsed.append((None, e.errors(include_url=False, include_context=False, include_input=False)))
+    return parsed
+
 # WebSocket endpoint
 @app.websocket("/ws/{order_id}")
 async def websocket_endpoint(websocket: WebSocket, order_id: int):
@@ -433,6 +629,8 @@ async def create_order(order: OrderCreate, current_user: models.User = Depends(g
     )
     
     db.add(db_order)
+    facets.order_opened(db, db_order)
+    user_stats.bump(db, current_user.id, total_orders=1)
     db.commit()
     db.refresh(db_order)
     
@@ -453,18 +651,100 @@ async def create_order(order: OrderCreate, current_user: models.User = Depends(g
         )
     
     db.commit()
+    order_events.publish(order_events.ORDER_CREATED, db_order)
     return db_order
 
+# Массовое создание заказов (JSON-массив или NDJSON)
+@app.post("/orders/bulk")
+async def create_orders_bulk(
+    request: Request,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.is_freelancer:
+        raise HTTPException(status_code=400, detail="Freelancers cannot create orders")
+    
+    items = parse_bulk_orders(await request.body(), request.headers.get("content-type", ""))
+    results = [
+        {"index": index, "status": "error", "errors": errors}
+        for index, (order, errors) in enumerate(items) if order is None
+    ]
+    valid = [(index, order) for index, (order, errors) in enumerate(items) if order is not None]
+    if not valid:
+        return {"created": 0, "failed": len(results), "results": results}
+    
+    # Все валидные заказы - одним executemany в одной транзакции
+    rows = [dict(order.model_dump(), client_id=current_user.id) for _, order in valid]
+    created = db.scalars(
+        insert(models.Order).returning(models.Order, sort_by_parameter_order=True),
+        rows
+    ).all()
+    facets.orders_opened(db, created)
+    user_stats.bump(db, current_user.id, total_orders=len(created))
+    
+    # Одно уведомление фрилансеру на всю пачку вместо уведомления на каждый заказ
+    freelancers = db.query(models.User.id).filter(
+        models.User.is_freelancer == True,
+        models.User.is_active == True
+    ).limit(20).all()
+    if len(created) == 1:
+        body = f"Появился новый заказ: '{created[0].title}' за {created[0].budget} руб."
+        related_id = created[0].id
+    else:
+        body = f"Появилось новых заказов: {len(created)}, например '{created[0].title}'"
+        related_id = None
+    if freelancers:
+        db.execute(insert(models.Notification), [
+            {
+                "user_id": freelancer_id,
+                "title": "Новые заказы в вашей ленте",
+                "body": body,
+                "notification_type": "new_order",
+                "related_id": related_id
+            }
+            for (freelancer_id,) in freelancers
+        ])
+    
+    order_ids = [order.id for order in created]
+    db.commit()
+    
+    # После commit объекты устарели - перечитываем их одним запросом
+    created = db.query(models.Order).filter(models.Order.id.in_(order_ids)).all()
+    for db_order in created:
+        order_events.publish(order_events.ORDER_CREATED, db_order)
+    
+    results.extend(
+        {"index": index, "status": "created", "id": order_id}
+        for (index, _), order_id in zip(valid, order_ids)
+    )
+    results.sort(key=lambda item: item["index"])
+    return {"created": len(order_ids), "failed": len(items) - len(order_ids), "results": results}
+
 # Получение всех заказов (с пагинацией)
-@app.get("/orders", response_model=List[OrderResponse])
+@app.get("/orders", response_model=Union[OrderPage, List[OrderResponse]])
 async def get_orders_paginated(
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None),
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     try:
         skip = (page - 1) * limit
+        selected = parse_order_fields(fields)
+        serialize = order_serializer(selected)
+        
+        # Лента фрилансера общая для всех - первые страницы отдаем из кэша
+        feed_key = None
+        if current_user.is_freelancer and feed_cache.is_cacheable(page, limit, cursor):
+            feed_key = (page, limit, cursor, selected)
+            cached = feed_cache.get(feed_key)
+            if cached is not None:
+                body, order_ids = cached
+                order_counters.add_impressions(order_ids)
+                return Response(content=body, media_type="application/json")
+            feed_version = feed_cache.version()
         
         if current_user.is_freelancer:
             # Для фрилансера показываем только открытые заказы
@@ -477,14 +757,38 @@ async def get_orders_paginated(
                 models.Order.client_id == current_user.id
             )
         
-        orders = query.order_by(
-            # Приоритет: премиум -> срочные -> обычные
-            models.Order.is_premium.desc(),
-            models.Order.is_urgent.desc(),
-            models.Order.created_at.desc()
-        ).offset(skip).limit(limit).all()
+        # Приоритет: премиум -> срочные -> обычные
+        sort_keys = [
+            models.Order.is_premium,
+            models.Order.is_urgent,
+            models.Order.created_at,
+            models.Order.id
+        ]
+        query = select_order_fields(query, selected, *sort_keys)
         
-        return orders
+        # Курсорная пагинация (cursor="" - первая страница)
+        if cursor is not None:
+            try:
+                orders, next_cursor = paginate_keyset(query, sort_keys, cursor, limit)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            result = {"items": [serialize(o) for o in orders], "next_cursor": next_cursor}
+        else:
+            orders = query.order_by(
+                *[key.desc() for key in sort_keys]
+            ).offset(skip).limit(limit).all()
+            result = [serialize(o) for o in orders]
+        
+        body = dumps(result)
+        if current_user.is_freelancer:
+            # Показы считаем только в ленте фрилансера
+            order_ids = tuple(o.id for o in orders)
+            order_counters.add_impressions(order_ids)
+            if feed_key is not None:
+                feed_cache.put(feed_key, body, feed_version, order_ids)
+        return Response(content=body, media_type="application/json")
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in get_orders_paginated: {e}")
         import traceback
@@ -492,13 +796,26 @@ async def get_orders_paginated(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 # Получение заказа по ID
-@app.get("/orders/{order_id}", response_model=OrderResponse)
-def get_order(order_id: int, db: Session = Depends(get_db)):
+@app.get("/orders/{order_id:int}", response_model=OrderResponse)
+def get_order(order_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     try:
         print(f"🔄 Запрос на /orders/{order_id}")
-        order = db.query(models.Order).filter(models.Order.id == order_id).first()
-        if order is None:
-            raise HTTPException(status_code=404, detail="Order not found")
+        cache_key = f"orders/{order_id}"
+        cached = tagged_cache.cache.get(cache_key)
+        if cached is tagged_cache.MISSING:
+            generation = tagged_cache.cache.generation()
+            order = db.query(models.Order).filter(models.Order.id == order_id).first()
+            if order is None:
+                raise HTTPException(status_code=404, detail="Order not found")
+            cached = (OrderResponse.model_validate(order), order.updated_at or order.created_at)
+            tagged_cache.cache.set(cache_key, cached, [model_tag("order", order_id)], generation)
+        order_counters.add_view(order_id)
+        
+        order, last_modified = cached
+        etag = http_cache.make_etag("order", order_id, last_modified)
+        if http_cache.is_not_modified(request, etag, last_modified):
+            return http_cache.not_modified(etag, last_modified)
+        http_cache.set_validators(response, etag, last_modified)
         return order
     except HTTPException:
         raise
@@ -508,16 +825,28 @@ def get_order(order_id: int, db: Session = Depends(get_db)):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail="Internal server error")
 
+# Получение нескольких заказов по списку id одним запросом
+@app.get("/orders/batch")
+def get_orders_batch(ids: str = Query(...), db: Session = Depends(get_db)):
+    order_ids = parse_id_list(ids)
+    orders = db.query(models.Order).filter(models.Order.id.in_(order_ids)).all()
+    # Ненайденные id в ответ не попадают
+    return FastJSONResponse({order.id: serialize_order(order) for order in orders})
+
 # Получение заказов пользователя (с пагинацией)
-@app.get("/my-orders", response_model=List[OrderResponse])
+@app.get("/my-orders", response_model=Union[OrderPage, List[OrderResponse]])
 async def get_my_orders_paginated(
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None),
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     try:
         skip = (page - 1) * limit
+        selected = parse_order_fields(fields)
+        serialize = order_serializer(selected)
         
         if current_user.is_freelancer:
             orders = db.query(models.Order).filter(
@@ -530,11 +859,28 @@ async def get_my_orders_paginated(
                 models.Order.status != "cancelled"
             )
         
+        orders = select_order_fields(orders, selected, models.Order.created_at, models.Order.id)
+        
+        if cursor is not None:
+            try:
+                items, next_cursor = paginate_keyset(
+                    orders, [models.Order.created_at, models.Order.id], cursor, limit
+                )
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            return FastJSONResponse({
+                "items": [serialize(o) for o in items],
+                "next_cursor": next_cursor
+            })
+        
         orders = orders.order_by(
-            models.Order.created_at.desc()
+            models.Order.created_at.desc(),
+            models.Order.id.desc()
         ).offset(skip).limit(limit).all()
         
-        return orders
+        return FastJSONResponse([serialize(o) for o in orders])
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in get_my_orders_paginated: {e}")
         import traceback
@@ -596,13 +942,13 @@ async def create_bid(bid: BidCreate, current_user: models.User = Depends(get_cur
         if order.status != "open":
             raise HTTPException(status_code=400, detail="Order is not open for bidding")
         
-        existing_bid = db.query(models.Bid).filter(
-            models.Bid.order_id == bid.order_id,
-            models.Bid.freelancer_id == current_user.id
-        ).first()
-        
-        if existing_bid:
-            raise HTTPException(status_code=400, detail="You have already bid on this order")
+        if "uq_bids_order_id_freelancer_id" in MISSING_INDEXES:
+            existing_bid = db.query(models.Bid.id).filter(
+                models.Bid.order_id == bid.order_id,
+                models.Bid.freelancer_id == current_user.id
+            ).first()
+            if existing_bid:
+                raise HTTPException(status_code=400, detail="You have already bid on this order")
         
         db_bid = models.Bid(
             order_id=bid.order_id,
@@ -613,11 +959,14 @@ async def create_bid(bid: BidCreate, current_user: models.User = Depends(get_cur
         )
         
         db.add(db_bid)
+        try:
+            db.flush()  # нужен id отклика для уведомления; повторный отклик отсекает уникальный индекс
+        except IntegrityError:
+            raise HTTPException(status_code=400, detail="You have already bid on this order")
         
-        # Получаем количество откликов на этот заказ
-        bid_count = db.query(models.Bid).filter(
-            models.Bid.order_id == bid.order_id
-        ).count()
+        # Статистика откликов обновляется в той же транзакции, без count() по откликам
+        bid_count = bid_stats.record_bid(db, bid.order_id, bid.amount)
+        user_stats.bump(db, current_user.id, total_bids=1)
         
         # Уведомление клиенту
         create_notification(
@@ -631,6 +980,7 @@ async def create_bid(bid: BidCreate, current_user: models.User = Depends(get_cur
         
         db.commit()
         db.refresh(db_bid)
+        order_events.publish(order_events.ORDER_BID_PLACED, order)
         
         # Добавляем информацию об исполнителе
         bid_response = {
@@ -657,71 +1007,104 @@ async def create_bid(bid: BidCreate, current_user: models.User = Depends(get_cur
         traceback.print_exc()
         raise HTTPException(status_code=500, detail="Internal server error")
 
-# Получение откликов пользователя
-@app.get("/my-bids", response_model=List[BidResponse])
-async def get_my_bids(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    bids = db.query(models.Bid).filter(models.Bid.freelancer_id == current_user.id).all()
-    
-    # Добавляем информацию об исполнителе и заказе
-    result = []
-    for bid in bids:
-        freelancer = db.query(models.User).filter(models.User.id == bid.freelancer_id).first()
-        order = db.query(models.Order).filter(models.Order.id == bid.order_id).first()
-        
-        bid_data = {
-            "id": bid.id,
-            "order_id": bid.order_id,
-            "freelancer_id": bid.freelancer_id,
-            "amount": bid.amount,
-            "proposal": bid.proposal,
-            "status": bid.status,
-            "created_at": bid.created_at,
-            "portfolio_links": bid.portfolio_links,
-            "freelancer_name": freelancer.full_name if freelancer else "Неизвестный исполнитель",
-            "order_title": order.title if order else "Неизвестный заказ"
-        }
-        result.append(bid_data)
+BID_FIELDS = tuple(BidResponse.model_fields)
+BID_COLUMNS = tuple(name for name in BID_FIELDS if name in models.Bid.__table__.columns)
+
+# Разбор fields= для откликов
+def parse_bid_fields(fields: Optional[str]):
+    try:
+        return parse_fields(fields, BID_FIELDS) or BID_FIELDS
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Отклики вместе с именем исполнителя и названием заказа - один запрос с JOIN
+# вместо отдельных запросов на каждый отклик. Выбираются только нужные колонки,
+# created_at и id нужны всегда - по ним идет пагинация
+def bid_listing_query(db: Session, selected):
+    columns = [
+        getattr(models.Bid, name) for name in BID_COLUMNS
+        if name in selected or name in ("created_at", "id")
+    ]
+    query = db.query(*columns)
+    if "freelancer_name" in selected:
+        query = query.outerjoin(models.User, models.User.id == models.Bid.freelancer_id).add_columns(
+            func.coalesce(models.User.full_name, "Неизвестный исполнитель").label("freelancer_name")
+        )
+    if "order_title" in selected:
+        query = query.outerjoin(models.Order, models.Order.id == models.Bid.order_id).add_columns(
+            func.coalesce(models.Order.title, "Неизвестный заказ").label("order_title")
+        )
+    return query
+
+# Общая часть списков откликов: фильтр по статусу, offset- или курсорная пагинация
+# Размер страницы откликов, если передан только page или cursor
+BID_PAGE_SIZE = 50
+
+def bid_listing_response(query, selected, status_filter: Optional[str],
+                         page: Optional[int], limit: Optional[int], cursor: Optional[str]):
+    if status_filter is not None:
+        if status_filter not in BID_STATUSES:
+            raise HTTPException(status_code=400, detail=f"status must be one of: {', '.join(BID_STATUSES)}")
+        query = query.filter(models.Bid.status == status_filter)
+    
+    serialize = cached_serializer(selected)
+    sort_keys = [models.Bid.created_at, models.Bid.id]
+    order = [key.desc() for key in sort_keys]
+    if cursor is None and page is None and limit is None:
+        # Без параметров пагинации - все отклики, как и до ее появления
+        return FastJSONResponse([serialize(row) for row in query.order_by(*order).all()])
+    
+    limit = limit or BID_PAGE_SIZE
+    if cursor is not None:
+        try:
+            rows, next_cursor = paginate_keyset(query, sort_keys, cursor, limit)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        return FastJSONResponse({"items": [serialize(row) for row in rows], "next_cursor": next_cursor})
     
-    return result
+    rows = query.order_by(*order).offset(((page or 1) - 1) * limit).limit(limit).all()
+    return FastJSONResponse([serialize(row) for row in rows])
+
+# Получение откликов пользователя
+@app.get("/my-bids", response_model=Union[BidPage, List[BidResponse]])
+async def get_my_bids(
+    page: Optional[int] = Query(None, ge=1),
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    fields: Optional[str] = Query(None),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    selected = parse_bid_fields(fields)
+    query = bid_listing_query(db, selected).filter(models.Bid.freelancer_id == current_user.id)
+    return bid_listing_response(query, selected, status_filter, page, limit, cursor)
 
 # Получение откликов на заказ
-@app.get("/orders/{order_id}/bids", response_model=List[BidResponse])
+@app.get("/orders/{order_id}/bids", response_model=Union[BidPage, List[BidResponse]])
 async def get_order_bids(
     order_id: int, 
+    page: Optional[int] = Query(None, ge=1),
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    fields: Optional[str] = Query(None),
     current_user: models.User = Depends(get_current_user), 
     db: Session = Depends(get_db)
 ):
     try:
-        order = db.query(models.Order).filter(models.Order.id == order_id).first()
-        if not order:
+        selected = parse_bid_fields(fields)
+        
+        client_id = db.query(models.Order.client_id).filter(models.Order.id == order_id).scalar()
+        if client_id is None:
             raise HTTPException(status_code=404, detail="Order not found")
         
         # Разрешаем просмотр откликов автору заказа
-        if order.client_id != current_user.id:
+        if client_id != current_user.id:
             raise HTTPException(status_code=403, detail="Not authorized to view bids for this order")
         
-        bids = db.query(models.Bid).filter(models.Bid.order_id == order_id).all()
-        
-        # Добавляем информацию об исполнителе
-        result = []
-        for bid in bids:
-            freelancer = db.query(models.User).filter(models.User.id == bid.freelancer_id).first()
-            
-            bid_data = {
-                "id": bid.id,
-                "order_id": bid.order_id,
-                "freelancer_id": bid.freelancer_id,
-                "amount": bid.amount,
-                "proposal": bid.proposal,
-                "status": bid.status,
-                "created_at": bid.created_at,
-                "portfolio_links": bid.portfolio_links,
-                "freelancer_name": freelancer.full_name if freelancer else "Неизвестный исполнитель",
-                "order_title": order.title
-            }
-            result.append(bid_data)
-        
-        return result
+        query = bid_listing_query(db, selected).filter(models.Bid.order_id == order_id)
+        return bid_listing_response(query, selected, status_filter, page, limit, cursor)
         
     except HTTPException:
         raise
@@ -744,51 +1127,63 @@ async def accept_bid(bid_id: int, current_user: models.User = Depends(get_curren
     if order.status != "open":
         raise HTTPException(status_code=400, detail="Order is not open")
     
-    # Обновляем статус бида
-    bid.status = "accepted"
-    
-    # Обновляем заказ
-    order.status = "in_progress"
-    order.freelancer_id = bid.freelancer_id
-    
-    # Отклоняем остальные отклики
-    rejected_bids = db.query(models.Bid).filter(
-        models.Bid.order_id == bid.order_id,
-        models.Bid.id != bid_id
-    ).all()
-    
-    for rejected_bid in rejected_bids:
-        rejected_bid.status = "rejected"
-        create_notification(
-            db,
-            rejected_bid.freelancer_id,
-            "Отклик отклонен",
-            f"Ваш отклик на заказ '{order.title}' был отклонен",
-            "bid_rejected",
-            order.id
+    # Заказ переводим в работу только если он все еще открыт: из двух
+    # одновременных принятий проходит одно, второе получает 409
+    accepted = db.execute(
+        update(models.Order)
+        .where(models.Order.id == order.id, models.Order.status == "open")
+        .values(status="in_progress", freelancer_id=bid.freelancer_id, updated_at=datetime.utcnow())
+    ).rowcount
+    if not accepted:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Order has already been accepted or closed")
+    facets.order_closed(db, order)
+    
+    db.execute(update(models.Bid).where(models.Bid.id == bid_id).values(status="accepted"))
+    user_stats.bump(db, bid.freelancer_id, accepted_bids=1)
+    
+    # Остальные отклики отклоняем одним UPDATE; уведомляем только тех, чей отклик еще ждал ответа
+    rejected_freelancers = db.execute(
+        update(models.Bid)
+        .where(
+            models.Bid.order_id == order.id,
+            models.Bid.id != bid_id,
+            models.Bid.status == "pending"
         )
+        .values(status="rejected")
+        .returning(models.Bid.freelancer_id)
+    ).scalars().all()
     
-    # Уведомление фрилансеру о принятии
-    create_notification(
-        db,
-        bid.freelancer_id,
-        "Ваш отклик принят!",
-        f"Клиент принял ваш отклик на заказ '{order.title}' за {bid.amount} руб. Теперь вы можете обсудить детали в чате.",
-        "bid_accepted",
-        order.id
-    )
-    
-    # Уведомление клиенту
-    create_notification(
-        db,
-        order.client_id,
-        "Отклик принят",
-        f"Вы приняли отклик от исполнителя на заказ '{order.title}'. Теперь вы можете обсудить детали в чате.",
-        "bid_accepted",
-        order.id
-    )
+    notifications = [
+        {
+            "user_id": freelancer_id,
+            "title": "Отклик отклонен",
+            "body": f"Ваш отклик на заказ '{order.title}' был отклонен",
+            "notification_type": "bid_rejected",
+            "related_id": order.id
+        }
+        for freelancer_id in set(rejected_freelancers)
+    ]
+    notifications.append({
+        # Уведомление фрилансеру о принятии
+        "user_id": bid.freelancer_id,
+        "title": "Ваш отклик принят!",
+        "body": f"Клиент принял ваш отклик на заказ '{order.title}' за {bid.amount} руб. Теперь вы можете обсудить детали в чате.",
+        "notification_type": "bid_accepted",
+        "related_id": order.id
+    })
+    notifications.append({
+        # Уведомление клиенту
+        "user_id": order.client_id,
+        "title": "Отклик принят",
+        "body": f"Вы приняли отклик от исполнителя на заказ '{order.title}'. Теперь вы можете обсудить детали в чате.",
+        "notification_type": "bid_accepted",
+        "related_id": order.id
+    })
+    db.execute(insert(models.Notification), notifications)
     
     db.commit()
+    order_events.publish(order_events.ORDER_ACCEPTED, order)
     return {"message": "Bid accepted successfully", "bid_id": bid_id, "order_id": order.id}
 
 # Отклонение отклика
@@ -833,6 +1228,13 @@ async def complete_order(order_id: int, current_user: models.User = Depends(get_
         raise HTTPException(status_code=400, detail="Order is not in progress")
     
     order.status = "completed"
+    budget = order.budget or 0
+    user_stats.bump(db, order.freelancer_id, freelancer_completed_orders=1, total_earnings=budget)
+    user_stats.bump(db, order.client_id, client_completed_orders=1, total_spent=budget)
+    # Число завершенных заказов входит в профиль исполнителя - меняем его версию
+    db.query(models.User).filter(models.User.id == order.freelancer_id).update(
+        {"updated_at": datetime.utcnow()}, synchronize_session=False
+    )
     
     create_notification(
         db,
@@ -853,6 +1255,7 @@ async def complete_order(order_id: int, current_user: models.User = Depends(get_
     )
     
     db.commit()
+    order_events.publish(order_events.ORDER_COMPLETED, order)
     return {"message": "Order completed successfully", "order_id": order_id}
 
 # Отмена заказа
@@ -868,7 +1271,10 @@ async def cancel_order(order_id: int, current_user: models.User = Depends(get_cu
     if order.status not in ["open", "in_progress"]:
         raise HTTPException(status_code=400, detail="Order cannot be cancelled")
     
+    if order.status == "open":
+        facets.order_closed(db, order)
     order.status = "cancelled"
+    user_stats.bump(db, order.client_id, total_orders=-1)
     
     # Уведомляем второго участника
     if current_user.id == order.client_id and order.freelancer_id:
@@ -891,8 +1297,41 @@ async def cancel_order(order_id: int, current_user: models.User = Depends(get_cu
         )
     
     db.commit()
+    order_events.publish(order_events.ORDER_CANCELLED, order)
     return {"message": "Order cancelled successfully", "order_id": order_id}
 
+# История чата частями: имя отправителя берется JOIN-ом, строки читаются пачками
+CHAT_STREAM_BATCH = 200
+
+def stream_chat_messages(order_id: int, user_id: int):
+    # Своя сессия: генератор дочитывает строки уже после выхода из обработчика
+    db = SessionLocal()
+    try:
+        rows = db.query(
+            models.ChatMessage.id,
+            models.ChatMessage.sender_id,
+            models.User.full_name.label("sender_name"),
+            models.ChatMessage.message,
+            models.ChatMessage.created_at,
+            models.ChatMessage.message_type
+        ).join(
+            models.User, models.User.id == models.ChatMessage.sender_id
+        ).filter(
+            models.ChatMessage.order_id == order_id
+        ).order_by(models.ChatMessage.created_at).yield_per(CHAT_STREAM_BATCH)
+        
+        yield from json_array_stream(rows, lambda msg: {
+            "id": msg.id,
+            "sender_id": msg.sender_id,
+            "sender_name": msg.sender_name,
+            "message": msg.message,
+            "is_own": msg.sender_id == user_id,
+            "created_at": msg.created_at,
+            "message_type": msg.message_type
+        }, batch_size=CHAT_STREAM_BATCH)
+    finally:
+        db.close()
+
 # Получение сообщений чата
 @app.get("/orders/{order_id}/messages")
 async def get_chat_messages(
@@ -908,22 +1347,10 @@ async def get_chat_messages(
         if current_user.id not in [order.client_id, order.freelancer_id]:
             raise HTTPException(status_code=403, detail="Not authorized")
         
-        messages = db.query(models.ChatMessage).filter(
-            models.ChatMessage.order_id == order_id
-        ).order_by(models.ChatMessage.created_at).all()
-        
-        return [
-            {
-                "id": msg.id,
-                "sender_id": msg.sender_id,
-                "sender_name": msg.sender.full_name,
-                "message": msg.message,
-                "is_own": msg.sender_id == current_user.id,
-                "created_at": msg.created_at,
-                "message_type": msg.message_type
-            }
-            for msg in messages
-        ]
+        # История чата может быть большой - отдаем потоком, сжатие идет по частям
+        return StreamingResponse(
+            stream_chat_messages(order_id, current_user.id), media_type="application/json"
+        )
         
     except HTTPException:
         raise
@@ -1018,14 +1445,9 @@ async def get_user_rating(user_id: int, db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Получаем все отзывы пользователя
-    reviews = db.query(models.Review).filter(
-        models.Review.reviewed_user_id == user_id
-    ).all()
-    
-    total_rating = sum(r.rating for r in reviews)
-    review_count = len(reviews)
-    avg_rating = total_rating / review_count if review_count > 0 else 0
+    # Агрегаты хранятся на пользователе - отзывы не читаем
+    review_count = user.review_count or 0
+    avg_rating = rating_stats.average(user)
     
     return {
         "rating": avg_rating,
@@ -1069,12 +1491,14 @@ async def promote_order(
     if order.client_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
+    if promotion_type not in promotions.PROMOTION_TYPES:
+        raise HTTPException(status_code=400, detail="Unknown promotion type")
+    
     # В реальном приложении здесь была бы проверка оплаты
-    order.is_promoted = True
-    order.promotion_type = promotion_type
-    order.promoted_until = datetime.utcnow() + timedelta(days=1)  # 24 часа продвижения
+    promotions.apply_promotion(order, promotion_type)
     
     db.commit()
+    order_events.publish(order_events.ORDER_PROMOTED, order)
     
     return {
         "message": f"Заказ продвинут как {promotion_type}",
@@ -1082,30 +1506,36 @@ async def promote_order(
         "promotion_type": promotion_type
     }
 
+# Шаблоны заказов (статичны - ETag считается один раз)
+ORDER_TEMPLATES = [
+    {
+        "id": 1,
+        "name": "Дизайн логотипа",
+        "category": "Дизайн",
+        "template": "Требования к логотипу:\n\n1. Стиль и концепция:\n   • Минимализм, современный стиль\n   • Векторный формат\n   • Адаптивный дизайн\n\n2. Цветовая палитра:\n   • Основной цвет: #[цвет1]\n   • Дополнительный: #[цвет2]\n   • Акцентный: #[цвет3]\n\n3. Сроки:\n   • Срок выполнения: [дней] дней\n   • Правки: 3 раунда\n\nБюджет: [сумма] ₽"
+    },
+    {
+        "id": 2,
+        "name": "Разработка сайта",
+        "category": "Разработка",
+        "template": "Техническое задание на разработку сайта:\n\n1. Тип сайта: [тип]\n2. Целевая аудитория: [описание]\n3. Основные цели: [цели]\n\n4. Функциональные требования:\n   • Адаптивная верстка\n   • CMS\n   • Форма обратной связи\n   • SEO-оптимизация\n\n5. Сроки и бюджет:\n   • Срок разработки: [дней] дней\n   • Бюджет: [сумма] ₽"
+    },
+    {
+        "id": 3,
+        "name": "Копирайтинг статьи",
+        "category": "Копирайтинг",
+        "template": "Требования к статье:\n\n1. Тема: [тема]\n2. Цель: [цель]\n3. Целевая аудитория: [ЦА]\n\n4. Технические требования:\n   • Объем: [символов]\n   • Уникальность: 95%+\n   • Ключевые слова: [слова]\n\n5. Сроки и оплата:\n   • Срок выполнения: [дней] дней\n   • Оплата: [сумма] ₽"
+    }
+]
+ORDER_TEMPLATES_ETAG = http_cache.make_etag("templates", json.dumps(ORDER_TEMPLATES, sort_keys=True))
+
 # Получение шаблонов заказов
 @app.get("/templates")
-async def get_templates(db: Session = Depends(get_db)):
-    templates = [
-        {
-            "id": 1,
-            "name": "Дизайн логотипа",
-            "category": "Дизайн",
-            "template": "Требования к логотипу:\n\n1. Стиль и концепция:\n   • Минимализм, современный стиль\n   • Векторный формат\n   • Адаптивный дизайн\n\n2. Цветовая палитра:\n   • Основной цвет: #[цвет1]\n   • Дополнительный: #[цвет2]\n   • Акцентный: #[цвет3]\n\n3. Сроки:\n   • Срок выполнения: [дней] дней\n   • Правки: 3 раунда\n\nБюджет: [сумма] ₽"
-        },
-        {
-            "id": 2,
-            "name": "Разработка сайта",
-            "category": "Разработка",
-            "template": "Техническое задание на разработку сайта:\n\n1. Тип сайта: [тип]\n2. Целевая аудитория: [описание]\n3. Основные цели: [цели]\n\n4. Функциональные требования:\n   • Адаптивная верстка\n   • CMS\n   • Форма обратной связи\n   • SEO-оптимизация\n\n5. Сроки и бюджет:\n   • Срок разработки: [дней] дней\n   • Бюджет: [сумма] ₽"
-        },
-        {
-            "id": 3,
-            "name": "Копирайтинг статьи",
-            "category": "Копирайтинг",
-            "template": "Требования к статье:\n\n1. Тема: [тема]\n2. Цель: [цель]\n3. Целевая аудитория: [ЦА]\n\n4. Технические требования:\n   • Объем: [символов]\n   • Уникальность: 95%+\n   • Ключевые слова: [слова]\n\n5. Сроки и оплата:\n   • Срок выполнения: [дней] дней\n   • Оплата: [сумма] ₽"
-        }
-    ]
-    return templates
+async def get_templates(request: Request, response: Response):
+    if http_cache.is_not_modified(request, ORDER_TEMPLATES_ETAG):
+        return http_cache.not_modified(ORDER_TEMPLATES_ETAG)
+    http_cache.set_validators(response, ORDER_TEMPLATES_ETAG)
+    return ORDER_TEMPLATES
 
 # Создание продвинутого заказа
 @app.post("/orders/promoted")
@@ -1128,12 +1558,17 @@ async def create_promoted_order(
         client_id=current_user.id,
         deadline=order.deadline,
         category=order.category,
-        is_urgent=is_urgent,
-        is_premium=is_premium,
         placement_type=placement_type
     )
+    # Оба флага - одно продвижение (тип premium), а не два, перезаписывающих друг друга
+    promotion_types = [t for t, enabled in (("premium", is_premium), ("urgent", is_urgent)) if enabled]
+    if promotion_types:
+        promotions.apply_promotion(db_order, *promotion_types)
     
     db.add(db_order)
+    db.flush()  # нужен id заказа для уведомлений
+    facets.order_opened(db, db_order)
+    user_stats.bump(db, current_user.id, total_orders=1)
     
     # Уведомления для фрилансеров
     freelancers = db.query(models.User).filter(
@@ -1153,26 +1588,41 @@ async def create_promoted_order(
     
     db.commit()
     db.refresh(db_order)
+    order_events.publish(order_events.ORDER_CREATED, db_order)
     
     return db_order
 
 # Получение срочных заказов
-@app.get("/orders/urgent")
+@app.get("/orders/urgent", response_model=Union[OrderPage, List[OrderResponse]])
 async def get_urgent_orders(
     skip: int = 0,
-    limit: int = 20,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
     db: Session = Depends(get_db)
 ):
-    # Получаем заказы, у которых дедлайн меньше чем через 24 часа
-    twenty_four_hours_from_now = datetime.utcnow() + timedelta(hours=24)
+    # Заказы, у которых дедлайн меньше чем через 24 часа, берем из индекса в памяти;
+    # при холодном старте индекс заполняется из БД
+    if not urgent_index.is_warm():
+        urgent_index.load(db)
     
-    orders = db.query(models.Order).filter(
-        models.Order.status == "open",
-        models.Order.deadline <= twenty_four_hours_from_now,
-        models.Order.deadline > datetime.utcnow()  # Только будущие дедлайны
-    ).order_by(models.Order.deadline.asc()).offset(skip).limit(limit).all()
+    if cursor is not None:
+        try:
+            # Курсор индекса - (deadline, id): другие типы сломали бы сравнение в bisect
+            after = decode_cursor(cursor, (datetime, int))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        orders = urgent_index.urgent(datetime.utcnow(), tuple(after) if after else None)
+        next_cursor = None
+        if len(orders) > limit:
+            orders = orders[:limit]
+            next_cursor = encode_cursor([orders[-1]["deadline"], orders[-1]["id"]])
+        return FastJSONResponse({
+            "items": [serialize_order_dict(o) for o in orders],
+            "next_cursor": next_cursor
+        })
     
-    return orders
+    orders = urgent_index.urgent(datetime.utcnow())
+    return FastJSONResponse([serialize_order_dict(o) for o in orders[skip:skip + limit]])
 
 # Создание отзыва
 @app.post("/reviews")
@@ -1193,17 +1643,17 @@ async def create_review(
     
     reviewed_user_id = order.freelancer_id if current_user.id == order.client_id else order.client_id
     
-    existing_review = db.query(models.Review).filter(
-        models.Review.order_id == review.order_id,
-        models.Review.reviewer_id == current_user.id
-    ).first()
-    
-    if existing_review:
-        raise HTTPException(status_code=400, detail="Already reviewed")
-    
     if not 1 <= review.rating <= 5:
         raise HTTPException(status_code=400, detail="Rating must be between 1 and 5")
     
+    if "uq_reviews_order_id_reviewer_id" in MISSING_INDEXES:
+        existing_review = db.query(models.Review.id).filter(
+            models.Review.order_id == review.order_id,
+            models.Review.reviewer_id == current_user.id
+        ).first()
+        if existing_review:
+            raise HTTPException(status_code=400, detail="Already reviewed")
+    
     db_review = models.Review(
         order_id=review.order_id,
         reviewer_id=current_user.id,
@@ -1213,18 +1663,14 @@ async def create_review(
     )
     
     db.add(db_review)
+    try:
+        db.flush()  # повторный отзыв отсекает уникальный индекс
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Already reviewed")
     
-    # Обновляем рейтинг пользователя
-    reviewed_user = db.query(models.User).filter(models.User.id == reviewed_user_id).first()
-    if reviewed_user:
-        all_reviews = db.query(models.Review).filter(
-            models.Review.reviewed_user_id == reviewed_user_id
-        ).all()
-        
-        total_rating = sum(r.rating for r in all_reviews) + review.rating
-        review_count = len(all_reviews) + 1
-        reviewed_user.rating = total_rating / review_count
-        reviewed_user.review_count = review_count
+    # Обновляем агрегаты рейтинга пользователя одним UPDATE
+    rating_stats.record_review(db, reviewed_user_id, review.rating)
     
     db.commit()
     db.refresh(db_review)
@@ -1237,36 +1683,58 @@ async def create_review(
     }
 
 # Получение отзывов пользователя (с пагинацией)
-@app.get("/users/{user_id}/reviews")
+@app.get("/users/{user_id}/reviews", response_model=Union[ReviewPage, List[ReviewResponse]])
 async def get_user_reviews(
     user_id: int, 
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1, le=50),
+    cursor: Optional[str] = Query(None),
     db: Session = Depends(get_db)
 ):
     try:
         skip = (page - 1) * limit
         
-        reviews = db.query(models.Review).filter(
+        # Автор отзыва и название заказа - одним запросом с JOIN, без ленивой загрузки на каждую строку
+        reviews = db.query(
+            models.Review.id,
+            models.Review.rating,
+            models.Review.comment,
+            models.Review.reply,
+            models.User.full_name.label("reviewer_name"),
+            models.Review.reviewer_id,
+            models.Order.title.label("order_title"),
+            models.Review.order_id,
+            models.Review.created_at,
+            models.Review.updated_at
+        ).outerjoin(
+            models.User, models.User.id == models.Review.reviewer_id
+        ).outerjoin(
+            models.Order, models.Order.id == models.Review.order_id
+        ).filter(
             models.Review.reviewed_user_id == user_id
-        ).order_by(models.Review.created_at.desc()).offset(skip).limit(limit).all()
+        )
         
-        return [
-            {
-                "id": r.id,
-                "rating": r.rating,
-                "comment": r.comment,
-                "reply": r.reply,
-                "reviewer_name": r.reviewer.full_name,
-                "reviewer_id": r.reviewer_id,
-                "order_title": r.order.title,
-                "order_id": r.order_id,
-                "created_at": r.created_at,
-                "updated_at": r.updated_at
-            }
-            for r in reviews
-        ]
+        if cursor is not None:
+            try:
+                items, next_cursor = paginate_keyset(
+                    reviews, [models.Review.created_at, models.Review.id], cursor, limit
+                )
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            return FastJSONResponse({
+                "items": [serialize_review(r) for r in items],
+                "next_cursor": next_cursor
+            })
+        
+        reviews = reviews.order_by(
+            models.Review.created_at.desc(),
+            models.Review.id.desc()
+        ).offset(skip).limit(limit).all()
         
+        return FastJSONResponse([serialize_review(r) for r in reviews])
+        
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error getting user reviews: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -1306,49 +1774,62 @@ async def add_review_reply(
 
 # Получение статистики отзывов
 @app.get("/users/{user_id}/reviews/stats")
-async def get_review_stats(user_id: int, db: Session = Depends(get_db)):
+async def get_review_stats(user_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     try:
-        reviews = db.query(models.Review).filter(
-            models.Review.reviewed_user_id == user_id
-        ).all()
-        
-        if not reviews:
-            return {
-                "total_reviews": 0,
-                "average_rating": 0,
-                "rating_distribution": {1: 0, 2: 0, 3: 0, 4: 0, 5: 0},
-                "recent_reviews": []
-            }
-        
-        total_reviews = len(reviews)
-        average_rating = sum(r.rating for r in reviews) / total_reviews
-        
-        # Распределение по звездам
-        rating_distribution = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-        for review in reviews:
-            rating_distribution[review.rating] += 1
-        
-        # Последние 5 отзывов
-        recent_reviews = [
-            {
-                "rating": r.rating,
-                "comment": r.comment[:100] + "..." if r.comment and len(r.comment) > 100 else r.comment,
-                "created_at": r.created_at
-            }
-            for r in sorted(reviews, key=lambda x: x.created_at, reverse=True)[:5]
-        ]
-        
-        return {
-            "total_reviews": total_reviews,
-            "average_rating": round(average_rating, 1),
-            "rating_distribution": rating_distribution,
-            "recent_reviews": recent_reviews
-        }
+        # Новый отзыв обновляет агрегаты пользователя - это сбрасывает тег user:{id}
+        cache_key = f"users/{user_id}/reviews/stats"
+        cached = tagged_cache.cache.get(cache_key)
+        if cached is tagged_cache.MISSING:
+            generation = tagged_cache.cache.generation()
+            cached = build_review_stats(db, user_id)
+            tagged_cache.cache.set(cache_key, cached, [model_tag("user", user_id)], generation)
+        
+        stats, last_modified = cached
+        if last_modified is None:
+            return stats
+        etag = http_cache.make_etag("review-stats", user_id, last_modified, stats["total_reviews"])
+        if http_cache.is_not_modified(request, etag, last_modified):
+            return http_cache.not_modified(etag, last_modified)
+        http_cache.set_validators(response, etag, last_modified)
+        return stats
         
     except Exception as e:
         print(f"Error getting review stats: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+# Статистика отзывов и время ее изменения (None - отзывов нет)
+def build_review_stats(db: Session, user_id: int):
+    user = db.query(models.User).filter(models.User.id == user_id).first()
+    if user is None or not user.review_count:
+        return {
+            "total_reviews": 0,
+            "average_rating": 0,
+            "rating_distribution": {1: 0, 2: 0, 3: 0, 4: 0, 5: 0},
+            "recent_reviews": []
+        }, None
+    
+    # Последние 5 отзывов - по индексу (reviewed_user_id, created_at)
+    reviews = db.query(
+        models.Review.rating, models.Review.comment, models.Review.created_at
+    ).filter(
+        models.Review.reviewed_user_id == user_id
+    ).order_by(models.Review.created_at.desc()).limit(5).all()
+    recent_reviews = [
+        {
+            "rating": r.rating,
+            "comment": r.comment[:100] + "..." if r.comment and len(r.comment) > 100 else r.comment,
+            "created_at": r.created_at
+        }
+        for r in reviews
+    ]
+    
+    return {
+        "total_reviews": user.review_count,
+        "average_rating": round(rating_stats.average(user), 1),
+        "rating_distribution": rating_stats.distribution(user),
+        "recent_reviews": recent_reviews
+    }, user.updated_at or user.created_at
+
 # Получение уведомлений пользователя
 @app.get("/notifications", response_model=List[NotificationResponse])
 async def get_notifications(
@@ -1359,7 +1840,7 @@ async def get_notifications(
         models.Notification.user_id == current_user.id
     ).order_by(models.Notification.created_at.desc()).limit(50).all()
     
-    return notifications
+    return FastJSONResponse([serialize_notification(n) for n in notifications])
 
 # Получение количества непрочитанных уведомлений
 @app.get("/notifications/unread-count")
@@ -1422,21 +1903,7 @@ async def read_users_me(current_user: models.User = Depends(get_current_user)):
     return current_user
 
 # Получение профиля пользователя
-@app.get("/users/{user_id}")
-async def get_user_profile(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    reviews = db.query(models.Review).filter(
-        models.Review.reviewed_user_id == user_id
-    ).all()
-    
-    completed_orders = db.query(models.Order).filter(
-        models.Order.freelancer_id == user_id,
-        models.Order.status == "completed"
-    ).count() if user.is_freelancer else 0
-    
+def build_user_profile(user: models.User, completed_orders: int) -> dict:
     return {
         "id": user.id,
         "email": user.email,
@@ -1448,6 +1915,84 @@ async def get_user_profile(user_id: int, db: Session = Depends(get_db)):
         "created_at": user.created_at
     }
 
+# Снимок профиля для кэша: ответ и время изменения (для ETag)
+def profile_snapshot(user: models.User, completed_orders: int):
+    return build_user_profile(user, completed_orders), user.updated_at or user.created_at
+
+# Получение нескольких профилей по списку id одним запросом
+@app.get("/users/batch")
+async def get_users_batch(ids: str = Query(...), db: Session = Depends(get_db)):
+    user_ids = parse_id_list(ids)
+    
+    # Профили из кэша, из БД - только недостающие
+    result = {}
+    missing = []
+    for user_id in user_ids:
+        snapshot = tagged_cache.cache.get(f"users/{user_id}")
+        if snapshot is tagged_cache.MISSING:
+            missing.append(user_id)
+        else:
+            result[user_id] = snapshot[0]
+    if not missing:
+        return result
+    
+    generation = tagged_cache.cache.generation()
+    users = db.query(models.User).filter(models.User.id.in_(missing)).all()
+    
+    # Завершенные заказы всех фрилансеров из списка - одним GROUP BY
+    freelancer_ids = [user.id for user in users if user.is_freelancer]
+    completed = {}
+    if freelancer_ids:
+        completed = dict(db.query(
+            models.Order.freelancer_id, func.count(models.Order.id)
+        ).filter(
+            models.Order.freelancer_id.in_(freelancer_ids),
+            models.Order.status == "completed"
+        ).group_by(models.Order.freelancer_id).all())
+    
+    for user in users:
+        snapshot = profile_snapshot(user, completed.get(user.id, 0))
+        tagged_cache.cache.set(f"users/{user.id}", snapshot, [model_tag("user", user.id)], generation)
+        result[user.id] = snapshot[0]
+    return result
+
+# Топ фрилансеров по байесовскому рейтингу (общий или по категории)
+@app.get("/freelancers/top")
+async def get_top_freelancers(
+    category: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=LEADERBOARD_TOP_K),
+    db: Session = Depends(get_db)
+):
+    # Холодный старт: фоновая задача еще не посчитала топ
+    if not leaderboard.is_warm():
+        leaderboard.refresh(db)
+    return leaderboard.top(category, limit)
+
+@app.get("/users/{user_id}")
+async def get_user_profile(user_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    snapshot = tagged_cache.cache.get(f"users/{user_id}")
+    if snapshot is tagged_cache.MISSING:
+        generation = tagged_cache.cache.generation()
+        user = db.query(models.User).filter(models.User.id == user_id).first()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        
+        completed_orders = db.query(models.Order).filter(
+            models.Order.freelancer_id == user_id,
+            models.Order.status == "completed"
+        ).count() if user.is_freelancer else 0
+        
+        snapshot = profile_snapshot(user, completed_orders)
+        tagged_cache.cache.set(f"users/{user_id}", snapshot, [model_tag("user", user_id)], generation)
+    
+    # Версия профиля: updated_at пользователя (обновляется и при завершении его заказов)
+    profile, last_modified = snapshot
+    etag = http_cache.make_etag("user", user_id, last_modified)
+    if http_cache.is_not_modified(request, etag, last_modified):
+        return http_cache.not_modified(etag, last_modified)
+    http_cache.set_validators(response, etag, last_modified)
+    return profile
+
 # Обновление профиля
 @app.patch("/users/me")
 async def update_profile(
@@ -1472,55 +2017,22 @@ async def root():
 @app.get("/stats")
 async def get_stats(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
     try:
+        # Счетчики поддерживаются переходами статусов; без строки - один агрегирующий запрос
+        stats = user_stats.get(db, current_user.id)
         if current_user.is_freelancer:
-            total_bids = db.query(models.Bid).filter(
-                models.Bid.freelancer_id == current_user.id
-            ).count()
-            
-            accepted_bids = db.query(models.Bid).filter(
-                models.Bid.freelancer_id == current_user.id,
-                models.Bid.status == "accepted"
-            ).count()
-            
-            completed_orders = db.query(models.Order).filter(
-                models.Order.freelancer_id == current_user.id,
-                models.Order.status == "completed"
-            ).count()
-            
-            total_earnings = db.query(models.Order).filter(
-                models.Order.freelancer_id == current_user.id,
-                models.Order.status == "completed"
-            ).with_entities(func.sum(models.Order.budget)).scalar() or 0
-            
             return {
-                "total_bids": total_bids,
-                "accepted_bids": accepted_bids,
-                "completed_orders": completed_orders,
-                "total_earnings": total_earnings,
+                "total_bids": stats["total_bids"],
+                "accepted_bids": stats["accepted_bids"],
+                "completed_orders": stats["freelancer_completed_orders"],
+                "total_earnings": stats["total_earnings"],
                 "rating": current_user.rating,
                 "review_count": current_user.review_count
             }
         else:
-            total_orders = db.query(models.Order).filter(
-                models.Order.client_id == current_user.id,
-                models.Order.status != 'cancelled'  # ИСКЛЮЧАЕМ отмененные!
-            ).count()
-            
-            completed_orders = db.query(models.Order).filter(
-                models.Order.client_id == current_user.id,
-                models.Order.status == "completed"
-            ).count()
-            
-            total_spent_result = db.query(func.sum(models.Order.budget)).filter(
-                models.Order.client_id == current_user.id,
-                models.Order.status == 'completed'
-            ).scalar()
-            total_spent = total_spent_result or 0
-            
             return {
-                "total_orders": total_orders,
-                "completed_orders": completed_orders,
-                "total_spent": total_spent
+                "total_orders": stats["total_orders"],
+                "completed_orders": stats["client_completed_orders"],
+                "total_spent": stats["total_spent"]
             }
     except Exception as e:
         print(f"Error in get_stats: {e}")
@@ -1537,18 +2049,24 @@ async def get_stats(current_user: models.User = Depends(get_current_user), db: S
         }
 
 # Поиск заказов
-@app.get("/orders/search")
+@app.get("/orders/search", response_model=Union[OrderSearchPage, List[OrderResponse]])
 async def search_orders(
     q: Optional[str] = Query(None),
     min_budget: Optional[float] = Query(None),
     max_budget: Optional[float] = Query(None),
     category: Optional[str] = Query(None),
     skip: int = 0,
-    limit: int = 50,
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    with_facets: bool = Query(False, alias="facets"),
+    fields: Optional[str] = Query(None),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     try:
+        selected = parse_order_fields(fields)
+        serialize = order_serializer(selected)
+        
         # Для фрилансеров показываем только открытые заказы
         if current_user.is_freelancer:
             query = db.query(models.Order).filter(models.Order.status == "open")
@@ -1556,13 +2074,12 @@ async def search_orders(
             # Для клиентов показываем их заказы
             query = db.query(models.Order).filter(models.Order.client_id == current_user.id)
         
-        if q:
-            query = query.filter(
-                or_(
-                    models.Order.title.ilike(f"%{q}%"),
-                    models.Order.description.ilike(f"%{q}%")
-                )
-            )
+        rank = None
+        if q and search_index.is_enabled():
+            # Полнотекстовый индекс с ранжированием по релевантности
+            query, rank = search_index.apply_search(query, q)
+        elif q:
+            query = search_index.apply_substring_search(query, q)
         
         if min_budget:
             query = query.filter(models.Order.budget >= min_budget)
@@ -1573,30 +2090,144 @@ async def search_orders(
         if category:
             query = query.filter(models.Order.category == category)
         
-        orders = query.order_by(models.Order.created_at.desc()).offset(skip).limit(limit).all()
-        return orders
+        if rank is not None:
+            query = query.add_columns(rank.label("rank"))
+            sort_keys = [rank, models.Order.id]
+        else:
+            sort_keys = [models.Order.created_at, models.Order.id]
+        query = select_order_fields(query, selected, models.Order.created_at, models.Order.id)
+        
+        next_cursor = None
+        if cursor is not None:
+            try:
+                if rank is not None:
+                    rows, next_cursor = paginate_keyset(
+                        query, sort_keys, cursor, limit,
+                        values_of=lambda row: [row.rank, row.Order.id]
+                    )
+                    orders = [row.Order for row in rows]
+                else:
+                    orders, next_cursor = paginate_keyset(query, sort_keys, cursor, limit)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+        else:
+            orders = query.order_by(
+                *[key.desc() for key in sort_keys]
+            ).offset(skip).limit(limit).all()
+            if rank is not None:
+                orders = [row.Order for row in orders]
+        
+        # Счетчики для фильтров берем из поддерживаемой таблицы, без GROUP BY по заказам
+        items = [serialize(o) for o in orders]
+        if with_facets:
+            return FastJSONResponse({"items": items, "next_cursor": next_cursor, "facets": facets.get_facets(db)})
+        if cursor is not None:
+            return FastJSONResponse({"items": items, "next_cursor": next_cursor})
+        return FastJSONResponse(items)
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in search_orders: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail="Internal server error")
 
+# Сохранение поиска: новые подходящие заказы придут уведомлением
+@app.post("/saved-searches", response_model=SavedSearchResponse)
+async def create_saved_search(
+    search: SavedSearchCreate,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if not current_user.is_freelancer:
+        raise HTTPException(status_code=400, detail="Only freelancers can save searches")
+    if not (search.query or "").strip() and not search.category \
+            and search.min_budget is None and search.max_budget is None:
+        raise HTTPException(status_code=400, detail="Saved search must have at least one condition")
+    
+    count = db.query(func.count(models.SavedSearch.id)).filter(
+        models.SavedSearch.user_id == current_user.id
+    ).scalar()
+    if count >= saved_searches.MAX_SAVED_SEARCHES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many saved searches (max {saved_searches.MAX_SAVED_SEARCHES})"
+        )
+    
+    db_search = models.SavedSearch(
+        user_id=current_user.id,
+        query=(search.query or "").strip() or None,
+        category=search.category,
+        min_budget=search.min_budget,
+        max_budget=search.max_budget
+    )
+    db.add(db_search)
+    db.commit()
+    db.refresh(db_search)
+    saved_searches.saved_search_index.add(db_search)
+    return db_search
+
+# Сохраненные поиски пользователя
+@app.get("/saved-searches", response_model=List[SavedSearchResponse])
+async def get_saved_searches(
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    return db.query(models.SavedSearch).filter(
+        models.SavedSearch.user_id == current_user.id
+    ).order_by(models.SavedSearch.id).all()
+
+# Удаление сохраненного поиска
+@app.delete("/saved-searches/{search_id}")
+async def delete_saved_search(
+    search_id: int,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    db_search = db.query(models.SavedSearch).filter(
+        models.SavedSearch.id == search_id,
+        models.SavedSearch.user_id == current_user.id
+    ).first()
+    
+    if not db_search:
+        raise HTTPException(status_code=404, detail="Saved search not found")
+    
+    db.delete(db_search)
+    db.commit()
+    saved_searches.saved_search_index.remove(search_id)
+    
+    return {"message": "Saved search deleted"}
+
 # Получение категорий заказов
-@app.get("/orders/categories")
-async def get_categories(db: Session = Depends(get_db)):
+@app.get("/orders/categories", response_model=Union[List[CategoryCount], List[str]])
+async def get_categories(
+    request: Request,
+    response: Response,
+    with_counts: bool = Query(False),
+    db: Session = Depends(get_db)
+):
     """
-    Возвращает список уникальных категорий из таблицы заказов.
+    Возвращает список категорий заказов из таблицы счетчиков facet_counts.
+    С with_counts=true - вместе с числом открытых заказов в каждой категории.
     """
     try:
-        # ПРАВИЛЬНЫЙ запрос: выбираем значение категории
-        categories = db.query(models.Order.category).filter(
-            models.Order.category.isnot(None),
-            models.Order.category != ''
-        ).distinct().all()
-        
-        # Преобразуем список кортежей в список строк
-        category_list = [category for (category,) in categories if category]
+        # Счетчики меняются только записью в facet_counts - это сбрасывает тег facetcount
+        counts = tagged_cache.cache.get("orders/categories")
+        if counts is tagged_cache.MISSING:
+            generation = tagged_cache.cache.generation()
+            counts = [(row.value, row.open_orders) for row in facets.category_counts(db)]
+            tagged_cache.cache.set("orders/categories", counts, [model_tag("facetcount")], generation)
+        
+        etag = http_cache.make_etag("categories", with_counts, counts)
+        if http_cache.is_not_modified(request, etag):
+            return http_cache.not_modified(etag)
+        http_cache.set_validators(response, etag)
+        
+        if with_counts:
+            return [{"category": value, "open_orders": open_orders} for value, open_orders in counts]
+        
+        category_list = [value for value, _ in counts]
         
         # Если нет категорий, возвращаем дефолтные
         if not category_list:
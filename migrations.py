@@ -0,0 +1,253 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+
+from database import engine, Base
+import models
+import bid_stats
+import rating_stats
+
+# Горячие запросы, план которых проверяем после миграции: (описание, SQL, ожидаемый индекс)
+HOT_QUERIES = [
+    ("Лента открытых заказов",
+     "SELECT id FROM orders WHERE status = 'open' ORDER BY created_at DESC LIMIT 20",
+     "ix_orders_status_created_at"),
+    ("Заказы клиента",
+     "SELECT id FROM orders WHERE client_id = 1 AND status != 'cancelled'",
+     "ix_orders_client_id_status"),
+    ("Заказы исполнителя",
+     "SELECT id FROM orders WHERE freelancer_id = 1 AND status = 'completed'",
+     "ix_orders_freelancer_id_status"),
+    ("Срочные заказы",
+     "SELECT id FROM orders WHERE status = 'open' AND deadline > '2000-01-01 00:00:00' "
+     "AND deadline <= '2000-01-02 00:00:00' ORDER BY deadline LIMIT 20",
+     "ix_orders_open_deadline"),
+    ("Ранжированная лента",
+     "SELECT id FROM orders WHERE status = 'open' "
+     "ORDER BY is_premium DESC, is_urgent DESC, created_at DESC, id DESC LIMIT 20",
+     "ix_orders_open_feed_rank"),
+    ("Истекшие продвижения",
+     "SELECT id FROM orders WHERE is_promoted = 1 AND promoted_until <= '2000-01-01 00:00:00'",
+     "ix_orders_promoted_until"),
+    ("Повторный отклик",
+     "SELECT id FROM bids WHERE order_id = 1 AND freelancer_id = 1",
+     "uq_bids_order_id_freelancer_id"),
+    ("Отклики фрилансера",
+     "SELECT id FROM bids WHERE freelancer_id = 1 AND status = 'accepted'",
+     "ix_bids_freelancer_id_status"),
+    ("Лента откликов фрилансера",
+     "SELECT id FROM bids WHERE freelancer_id = 1 ORDER BY created_at DESC, id DESC LIMIT 50",
+     "ix_bids_freelancer_id_created_at"),
+    ("История чата",
+     "SELECT id FROM chat_messages WHERE order_id = 1 ORDER BY created_at",
+     "ix_chat_messages_order_id_created_at"),
+    ("Уведомления пользователя",
+     "SELECT id FROM notifications WHERE user_id = 1 ORDER BY created_at DESC LIMIT 50",
+     "ix_notifications_user_id_created_at"),
+    ("Непрочитанные уведомления",
+     "SELECT count(*) FROM notifications WHERE user_id = 1 AND is_read = 0",
+     "ix_notifications_user_id_is_read_created_at"),
+    ("Отзывы о пользователе",
+     "SELECT id FROM reviews WHERE reviewed_user_id = 1 ORDER BY created_at DESC LIMIT 10",
+     "ix_reviews_reviewed_user_id_created_at"),
+]
+
+
+# Индексы, замененные новыми (например, уникальными): старый -> заменяющий.
+# Старый удаляется, только когда заменяющий уже есть в БД
+OBSOLETE_INDEXES = {
+    "ix_bids_order_id_freelancer_id": "uq_bids_order_id_freelancer_id",
+}
+
+
+def dedupe_bids(conn) -> int:
+    """Повторные отклики фрилансера на заказ: оставляем принятый, иначе самый ранний"""
+    deleted = conn.execute(text(
+        "DELETE FROM bids WHERE id NOT IN ("
+        "SELECT COALESCE(MIN(CASE WHEN status = 'accepted' THEN id END), MIN(id)) "
+        "FROM bids GROUP BY order_id, freelancer_id)"
+    )).rowcount
+    if deleted:
+        bid_stats.rebuild(conn)
+    return deleted
+
+
+def dedupe_reviews(conn) -> int:
+    """Повторные отзывы автора по заказу: оставляем самый ранний"""
+    deleted = conn.execute(text(
+        "DELETE FROM reviews WHERE id NOT IN ("
+        "SELECT MIN(id) FROM reviews GROUP BY order_id, reviewer_id)"
+    )).rowcount
+    if deleted:
+        rating_stats.rebuild(conn)
+    return deleted
+
+
+# Очистка дубликатов в старых данных перед созданием уникального индекса: индекс -> функция(conn)
+DEDUPLICATES = {
+    "uq_bids_order_id_freelancer_id": dedupe_bids,
+    "uq_reviews_order_id_reviewer_id": dedupe_reviews,
+}
+
+
+def add_missing_columns(bind=engine) -> list:
+    """
+    Добавляет в существующие таблицы новые колонки моделей через ALTER TABLE ADD COLUMN.
+    Новые колонки должны быть nullable или иметь server_default.
+    """
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = CreateColumn(column).compile(dialect=bind.dialect)
+                print(f"🛠️ Добавление колонки {table.name}.{column.name}...")
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+                added.append(f"{table.name}.{column.name}")
+
+    return added
+
+
+def create_missing_indexes(bind=engine) -> list:
+    """
+    Создает объявленные в моделях индексы, которых нет в существующей БД.
+    create_all() индексы у уже существующих таблиц не создает, а пересоздавать
+    таблицы ради них не нужно: CREATE INDEX строит индекс по месту.
+    """
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+
+    # В PostgreSQL строим индексы без блокировки записи (CONCURRENTLY вне транзакции)
+    concurrently = bind.dialect.name == "postgresql"
+    options = {"isolation_level": "AUTOCOMMIT"} if concurrently else {}
+
+    with bind.connect().execution_options(**options) as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing:
+                    continue
+                if concurrently:
+                    index.dialect_options["postgresql"]["concurrently"] = True
+                print(f"🛠️ Создание индекса {index.name}...")
+                try:
+                    if index.name in DEDUPLICATES:
+                        deleted = DEDUPLICATES[index.name](conn)
+                        if deleted:
+                            print(f"🛠️ Удалено дубликатов перед {index.name}: {deleted}")
+                    index.create(bind=conn)
+                except Exception as e:
+                    # Не мешаем запуску: без уникального индекса эндпоинты проверяют
+                    # дубликаты запросом (см. missing_indexes)
+                    print(f"❌ Не удалось создать индекс {index.name}: {e}")
+                    if not concurrently:
+                        conn.rollback()
+                    continue
+                if not concurrently:
+                    # Фиксируем каждый индекс (вместе с очисткой дубликатов) отдельно:
+                    # откат после ошибки не должен терять уже созданные
+                    conn.commit()
+                created.append(index.name)
+        if not concurrently:
+            conn.commit()
+
+    if created and bind.dialect.name == "sqlite":
+        # Обновляем статистику, чтобы планировщик начал использовать новые индексы
+        with bind.begin() as conn:
+            conn.execute(text("ANALYZE"))
+
+    return created
+
+
+# Заполнение денормализованных колонок сразу после их добавления: колонка -> функция(conn)
+BACKFILLS = {
+    "orders.bid_count": bid_stats.rebuild,
+    "users.rating_sum": rating_stats.rebuild,
+}
+
+
+def drop_obsolete_indexes(bind=engine) -> list:
+    inspector = inspect(bind)
+    existing = {
+        ix["name"]
+        for table in inspector.get_table_names()
+        for ix in inspector.get_indexes(table)
+    }
+    dropped = []
+    with bind.begin() as conn:
+        for name, replacement in OBSOLETE_INDEXES.items():
+            if name not in existing:
+                continue
+            if replacement not in existing:
+                print(f"❌ Индекс {name} сохранен: заменяющий {replacement} не создан")
+                continue
+            print(f"🛠️ Удаление индекса {name}...")
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+            dropped.append(name)
+    return dropped
+
+
+def missing_indexes(bind=engine) -> set:
+    """Объявленные в моделях индексы, которых нет в БД (например, не удалось создать уникальный)"""
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    missing = set()
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        missing.update(index.name for index in table.indexes if index.name not in existing)
+    return missing
+
+
+def run_migrations(bind=engine) -> None:
+    added = add_missing_columns(bind)
+    if added:
+        print(f"✅ Миграция: добавлено колонок - {len(added)}")
+    for column in added:
+        if column in BACKFILLS:
+            print(f"🛠️ Заполнение {column}...")
+            with bind.begin() as conn:
+                BACKFILLS[column](conn)
+    created = create_missing_indexes(bind)
+    if created:
+        print(f"✅ Миграция: создано индексов - {len(created)}")
+    drop_obsolete_indexes(bind)
+
+
+def explain_hot_queries(bind=engine) -> bool:
+    """Печатает план каждого горячего запроса и проверяет, что он идет по своему индексу"""
+    if bind.dialect.name == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    else:
+        prefix = "EXPLAIN "
+
+    all_ok = True
+    with bind.connect() as conn:
+        for title, sql, index_name in HOT_QUERIES:
+            plan = [" | ".join(str(col) for col in row) for row in conn.execute(text(prefix + sql))]
+            ok = any(index_name in line for line in plan)
+            all_ok = all_ok and ok
+            print(f"{'✅' if ok else '❌'} {title}: {index_name}")
+            for line in plan:
+                print(f"    {line}")
+    return all_ok
+
+
+if __name__ == "__main__":
+    run_migrations()
+    if not explain_hot_queries():
+        sys.exit(1)
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Float, Text, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Text, DateTime, Boolean, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from datetime import datetime
 from database import Base
 
 class User(Base):
@@ -15,6 +16,15 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     rating = Column(Float, default=0.0)
     review_count = Column(Integer, default=0)
+    # Агрегаты отзывов (rating_stats): сумма оценок и число отзывов с каждой оценкой
+    rating_sum = Column(Integer, default=0, server_default="0", nullable=False)
+    rating_1 = Column(Integer, default=0, server_default="0", nullable=False)
+    rating_2 = Column(Integer, default=0, server_default="0", nullable=False)
+    rating_3 = Column(Integer, default=0, server_default="0", nullable=False)
+    rating_4 = Column(Integer, default=0, server_default="0", nullable=False)
+    rating_5 = Column(Integer, default=0, server_default="0", nullable=False)
+    # Версия строки для ETag (ставится из Python - нужна точность до микросекунд)
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow, nullable=True)
     
     # Отношения
     orders_created = relationship("Order", 
@@ -60,6 +70,25 @@ class Order(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     deadline = Column(DateTime(timezone=True), nullable=True)
     category = Column(String, default="other")
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow, nullable=True)
+    
+    # Продвижение: флаги влияют на порядок ленты, promoted_until - срок действия
+    is_premium = Column(Boolean, default=False, server_default="0", nullable=False)
+    is_urgent = Column(Boolean, default=False, server_default="0", nullable=False)
+    is_promoted = Column(Boolean, default=False, server_default="0", nullable=False)
+    promotion_type = Column(String, nullable=True)
+    placement_type = Column(String, nullable=True)
+    promoted_until = Column(DateTime(timezone=True), nullable=True)
+    
+    # Просмотры карточки и показы в ленте (пишутся пачками через order_counters)
+    view_count = Column(Integer, default=0, server_default="0", nullable=False)
+    impression_count = Column(Integer, default=0, server_default="0", nullable=False)
+    
+    # Статистика откликов, обновляется вместе со вставкой отклика (bid_stats)
+    bid_count = Column(Integer, default=0, server_default="0", nullable=False)
+    min_bid = Column(Float, nullable=True)
+    max_bid = Column(Float, nullable=True)
+    avg_bid = Column(Float, nullable=True)
     
     # Отношения
     client = relationship("User", 
@@ -83,6 +112,25 @@ class Order(Base):
                           back_populates="order",
                           lazy="dynamic",
                           cascade="all, delete-orphan")
+    
+    # Индексы под горячие запросы: лента, "мои заказы", срочные
+    __table_args__ = (
+        Index("ix_orders_status_created_at", "status", "created_at"),
+        Index("ix_orders_client_id_status", "client_id", "status"),
+        Index("ix_orders_freelancer_id_status", "freelancer_id", "status"),
+        # Частичный индекс: срочные заказы ищутся только среди открытых
+        Index("ix_orders_open_deadline", "deadline",
+              sqlite_where=text("status = 'open'"),
+              postgresql_where=text("status = 'open'")),
+        # Ранжированная лента: премиум -> срочные -> новые
+        Index("ix_orders_open_feed_rank", "is_premium", "is_urgent", "created_at", "id",
+              sqlite_where=text("status = 'open'"),
+              postgresql_where=text("status = 'open'")),
+        # Для фонового снятия истекших продвижений
+        Index("ix_orders_promoted_until", "promoted_until",
+              sqlite_where=text("is_promoted = 1"),
+              postgresql_where=text("is_promoted = true")),
+    )
 
 class Bid(Base):
     __tablename__ = "bids"
@@ -100,6 +148,13 @@ class Bid(Base):
     order = relationship("Order", back_populates="bids")
     freelancer = relationship("User", back_populates="bids")
     
+    __table_args__ = (
+        # Один отклик фрилансера на заказ - гарантирует БД, без проверочного SELECT
+        Index("uq_bids_order_id_freelancer_id", "order_id", "freelancer_id", unique=True),
+        Index("ix_bids_freelancer_id_status", "freelancer_id", "status"),
+        Index("ix_bids_freelancer_id_created_at", "freelancer_id", "created_at"),
+    )
+    
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
     
@@ -116,6 +171,10 @@ class ChatMessage(Base):
     sender = relationship("User", 
                          foreign_keys=[sender_id],
                          back_populates="sent_messages")
+    
+    __table_args__ = (
+        Index("ix_chat_messages_order_id_created_at", "order_id", "created_at"),
+    )
 
 
 class Notification(Base):
@@ -134,6 +193,12 @@ class Notification(Base):
     user = relationship("User", 
                        foreign_keys=[user_id],
                        back_populates="notifications")
+    
+    __table_args__ = (
+        # Непрочитанные (счетчик, read-all) и лента уведомлений
+        Index("ix_notifications_user_id_is_read_created_at", "user_id", "is_read", "created_at"),
+        Index("ix_notifications_user_id_created_at", "user_id", "created_at"),
+    )
 
 class Review(Base):
     __tablename__ = "reviews"
@@ -144,7 +209,9 @@ class Review(Base):
     reviewed_user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     rating = Column(Integer, nullable=False)
     comment = Column(Text)
+    reply = Column(Text, nullable=True)  # ответ исполнителя на отзыв
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow, nullable=True)
     
     # Исправленные отношения
     order = relationship("Order", 
@@ -157,4 +224,45 @@ class Review(Base):
     
     reviewed_user = relationship("User", 
                                foreign_keys=[reviewed_user_id],
-                               back_populates="received_reviews")
\ No newline at end of file
+                               back_populates="received_reviews")
+    
+    __table_args__ = (
+        Index("ix_reviews_reviewed_user_id_created_at", "reviewed_user_id", "created_at"),
+        # Один отзыв участника по заказу
+        Index("uq_reviews_order_id_reviewer_id", "order_id", "reviewer_id", unique=True),
+    )
+
+class FacetCount(Base):
+    """Счетчики открытых заказов по категориям и диапазонам бюджета для фильтров поиска"""
+    __tablename__ = "facet_counts"
+    
+    facet = Column(String, primary_key=True)  # category, budget
+    value = Column(String, primary_key=True)
+    open_orders = Column(Integer, default=0, server_default="0", nullable=False)
+
+class SavedSearch(Base):
+    """Сохраненный поиск фрилансера: новые заказы сверяются с ним при создании"""
+    __tablename__ = "saved_searches"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    query = Column(String)
+    category = Column(String)
+    min_budget = Column(Float)
+    max_budget = Column(Float)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class UserStats(Base):
+    """Счетчики дашборда /stats, поддерживаются переходами статусов откликов и заказов"""
+    __tablename__ = "user_stats"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    # Фрилансер
+    total_bids = Column(Integer, default=0, server_default="0", nullable=False)
+    accepted_bids = Column(Integer, default=0, server_default="0", nullable=False)
+    freelancer_completed_orders = Column(Integer, default=0, server_default="0", nullable=False)
+    total_earnings = Column(Float, default=0, server_default="0", nullable=False)
+    # Клиент
+    total_orders = Column(Integer, default=0, server_default="0", nullable=False)
+    client_completed_orders = Column(Integer, default=0, server_default="0", nullable=False)
+    total_spent = Column(Float, default=0, server_default="0", nullable=False)
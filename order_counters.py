@@ -0,0 +1,95 @@
+import asyncio
+import threading
+from typing import Dict, Iterable, List
+
+from sqlalchemy import bindparam, update
+
+import models
+import tagged_cache
+from database import SessionLocal
+
+# Как часто накопленные счетчики записываются в БД
+COUNTER_FLUSH_INTERVAL_SECONDS = 10
+
+
+class OrderCounterBuffer:
+    """
+    Write-behind буфер просмотров и показов заказов. Запросы только увеличивают
+    счетчики в памяти, в БД они уходят пачкой одним UPDATE - строки orders
+    не блокируются на каждый просмотр.
+    """
+
+    def __init__(self):
+        self._views: Dict[int, int] = {}
+        self._impressions: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def add_view(self, order_id: int) -> None:
+        with self._lock:
+            self._views[order_id] = self._views.get(order_id, 0) + 1
+
+    def add_impressions(self, order_ids: Iterable[int]) -> None:
+        with self._lock:
+            for order_id in order_ids:
+                self._impressions[order_id] = self._impressions.get(order_id, 0) + 1
+
+    def _take(self) -> List[dict]:
+        with self._lock:
+            views, self._views = self._views, {}
+            impressions, self._impressions = self._impressions, {}
+        return [
+            {"b_id": order_id, "b_views": views.get(order_id, 0), "b_impressions": impressions.get(order_id, 0)}
+            for order_id in set(views) | set(impressions)
+        ]
+
+    def _restore(self, rows: List[dict]) -> None:
+        with self._lock:
+            for row in rows:
+                if row["b_views"]:
+                    self._views[row["b_id"]] = self._views.get(row["b_id"], 0) + row["b_views"]
+                if row["b_impressions"]:
+                    self._impressions[row["b_id"]] = self._impressions.get(row["b_id"], 0) + row["b_impressions"]
+
+    def flush(self) -> int:
+        """Записывает накопленные счетчики одним executemany UPDATE; при ошибке возвращает их в буфер"""
+        rows = self._take()
+        if not rows:
+            return 0
+        table = models.Order.__table__
+        stmt = (
+            update(table)
+            .where(table.c.id == bindparam("b_id"))
+            .values(
+                view_count=table.c.view_count + bindparam("b_views"),
+                impression_count=table.c.impression_count + bindparam("b_impressions"),
+                # Иначе сработает onupdate и сменится версия заказа (ETag/Last-Modified)
+                updated_at=table.c.updated_at,
+            )
+            # Счетчики не сбрасывают кэш карточек заказов: view_count в них обновится по TTL
+            .execution_options(**{tagged_cache.SKIP_INVALIDATION: True})
+        )
+        db = SessionLocal()
+        try:
+            db.execute(stmt, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            self._restore(rows)
+            raise
+        finally:
+            db.close()
+        return len(rows)
+
+
+order_counters = OrderCounterBuffer()
+
+
+async def run_counter_flusher(interval: float = COUNTER_FLUSH_INTERVAL_SECONDS):
+    """Фоновая задача: периодически сбрасывает счетчики в БД"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await loop.run_in_executor(None, order_counters.flush)
+        except Exception as e:
+            print(f"Error in counter flusher: {e}")
@@ -0,0 +1,34 @@
+from collections import defaultdict
+from typing import Callable, Dict, List
+
+# События жизненного цикла заказа. Публикуются обработчиками API после commit,
+# подписчики (кэши, индексы) обновляют по ним свое состояние.
+ORDER_CREATED = "created"
+ORDER_PROMOTED = "promoted"
+ORDER_ACCEPTED = "accepted"
+ORDER_COMPLETED = "completed"
+ORDER_CANCELLED = "cancelled"
+# Новый отклик: меняются bid_count/min_bid/max_bid в карточке заказа
+ORDER_BID_PLACED = "bid_placed"
+# Массовое событие (фоновое снятие продвижений) - order передается как None
+ORDER_DEMOTED = "demoted"
+
+_subscribers: Dict[str, List[Callable]] = defaultdict(list)
+
+
+def subscribe(*events: str):
+    """Декоратор: подписывает handler(event, order) на перечисленные события"""
+    def decorator(handler: Callable):
+        for event in events:
+            _subscribers[event].append(handler)
+        return handler
+    return decorator
+
+
+def publish(event: str, order) -> None:
+    for handler in _subscribers[event]:
+        try:
+            handler(event, order)
+        except Exception as e:
+            # Ошибка подписчика не должна ломать уже выполненный запрос
+            print(f"Error in order event handler {handler.__name__} ({event}): {e}")
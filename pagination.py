@@ -0,0 +1,106 @@
+import base64
+import json
+from datetime import datetime
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import literal, tuple_
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(values: list) -> str:
+    """Упаковывает значения ключей сортировки последней строки в непрозрачный курсор"""
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _matches(value, expected: Optional[type]) -> bool:
+    if isinstance(value, (list, dict)):
+        return False
+    if expected is None:
+        return True
+    if isinstance(value, bool):
+        return expected is bool
+    if expected is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, expected)
+
+
+def _python_type(column) -> Optional[type]:
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        # Выражение без известного типа (например, ранг поиска) - проверяем только, что это скаляр
+        return None
+
+
+def decode_cursor(cursor: Optional[str], types: Optional[Sequence[Optional[type]]] = None) -> Optional[list]:
+    """
+    Распаковывает курсор. Пустой курсор означает первую страницу.
+    types - ожидаемые типы значений: чужой или поддельный курсор отклоняется ValueError
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list):
+            raise ValueError("Invalid cursor")
+        values = [_decode_value(v) for v in values]
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if types is not None:
+        if len(values) != len(types) or not all(_matches(v, t) for v, t in zip(values, types)):
+            raise ValueError("Invalid cursor")
+    return values
+
+
+def _bind_value(column, value, dialect: str):
+    # SQLite хранит CURRENT_TIMESTAMP без микросекунд, а SQLAlchemy пишет даты
+    # с ".%f" - для колонок с server_default сравниваем в формате самой БД,
+    # иначе строка с равным временем окажется "меньше" границы курсора
+    server_default = getattr(getattr(column, "expression", None), "server_default", None)
+    if (dialect == "sqlite" and isinstance(value, datetime)
+            and server_default is not None and value.microsecond == 0):
+        return literal(value.strftime("%Y-%m-%d %H:%M:%S"))
+    return literal(value, column.type)
+
+
+def paginate_keyset(query, columns: list, cursor: Optional[str], limit: int,
+                    descending: bool = True,
+                    values_of: Optional[Callable] = None) -> Tuple[List, Optional[str]]:
+    """
+    Keyset-пагинация: вместо OFFSET продолжаем с позиции после последней строки.
+    Последней колонкой в columns должен быть уникальный ключ (id).
+    values_of(item) достает значения ключей, если среди columns есть выражения.
+    """
+    values = decode_cursor(cursor, [_python_type(c) for c in columns])
+    if values is not None:
+        dialect = query.session.get_bind().dialect.name
+        row = tuple_(*columns)
+        bound = tuple_(*[_bind_value(c, v, dialect) for c, v in zip(columns, values)])
+        query = query.filter(row < bound if descending else row > bound)
+
+    order = [c.desc() if descending else c.asc() for c in columns]
+    items = query.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        if values_of is not None:
+            next_cursor = encode_cursor(values_of(last))
+        else:
+            next_cursor = encode_cursor([getattr(last, c.key) for c in columns])
+
+    return items, next_cursor
@@ -0,0 +1,70 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+import models
+import order_events
+from database import SessionLocal
+
+PROMOTION_TYPES = ("urgent", "premium")
+PROMOTION_DURATION = timedelta(days=1)  # 24 часа продвижения
+# Как часто фоновая задача снимает истекшие продвижения
+PROMOTION_SWEEP_INTERVAL_SECONDS = 60
+
+
+def apply_promotion(order: models.Order, *promotion_types: str, duration: timedelta = PROMOTION_DURATION):
+    """
+    Включает продвижение заказа; флаги типов определяют позицию в ленте.
+    Несколько типов сразу - одно продвижение с общим сроком, тип - старший в ленте
+    """
+    order.is_promoted = True
+    order.promotion_type = "premium" if "premium" in promotion_types else promotion_types[0]
+    order.promoted_until = datetime.utcnow() + duration
+    if "premium" in promotion_types:
+        order.is_premium = True
+    if "urgent" in promotion_types:
+        order.is_urgent = True
+
+
+def demote_expired(db) -> int:
+    """Одним UPDATE снимает все продвижения, срок которых истек"""
+    result = db.execute(
+        update(models.Order)
+        .where(
+            models.Order.is_promoted == True,
+            models.Order.promoted_until <= datetime.utcnow()
+        )
+        .values(
+            is_promoted=False,
+            is_premium=False,
+            is_urgent=False,
+            promotion_type=None,
+            updated_at=datetime.utcnow()
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def _sweep_once() -> int:
+    db = SessionLocal()
+    try:
+        return demote_expired(db)
+    finally:
+        db.close()
+
+
+async def run_promotion_sweeper(interval: float = PROMOTION_SWEEP_INTERVAL_SECONDS):
+    """Фоновая задача: периодически снимает истекшие продвижения"""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            demoted = await loop.run_in_executor(None, _sweep_once)
+            if demoted:
+                print(f"⏳ Снято истекших продвижений: {demoted}")
+                order_events.publish(order_events.ORDER_DEMOTED, None)
+        except Exception as e:
+            print(f"Error in promotion sweeper: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,58 @@
+from datetime import datetime
+
+from sqlalchemy import func, select, update
+
+import models
+
+# Агрегаты отзывов на пользователе: сумма оценок, число отзывов, гистограмма 1-5 звезд.
+# Поддерживаются вставкой отзыва, поэтому рейтинг и распределение читаются без обхода отзывов
+RATING_VALUES = (1, 2, 3, 4, 5)
+
+
+def _bucket(rating: int):
+    return getattr(models.User, f"rating_{rating}")
+
+
+def record_review(db, user_id: int, rating: int) -> None:
+    """Учитывает новый отзыв в агрегатах пользователя, в той же транзакции что и вставка отзыва"""
+    user = models.User
+    bucket = _bucket(rating)
+    db.execute(
+        update(user)
+        .where(user.id == user_id)
+        .values({
+            user.rating_sum: user.rating_sum + rating,
+            user.review_count: func.coalesce(user.review_count, 0) + 1,
+            user.rating: (user.rating_sum + rating) * 1.0 / (func.coalesce(user.review_count, 0) + 1),
+            bucket: bucket + 1,
+            user.updated_at: datetime.utcnow(),
+        })
+        .execution_options(synchronize_session=False)
+    )
+
+
+def distribution(user: models.User) -> dict:
+    return {rating: getattr(user, f"rating_{rating}") or 0 for rating in RATING_VALUES}
+
+
+def average(user: models.User) -> float:
+    return user.rating_sum / user.review_count if user.review_count else 0
+
+
+def rebuild(db) -> None:
+    """Полный пересчет агрегатов по таблице отзывов (после миграции)"""
+    reviews = models.Review
+
+    def per_user(aggregate, *criteria):
+        return select(func.coalesce(aggregate, 0)).where(
+            reviews.reviewed_user_id == models.User.id, *criteria
+        ).scalar_subquery()
+
+    values = {
+        models.User.rating_sum: per_user(func.sum(reviews.rating)),
+        models.User.review_count: per_user(func.count(reviews.id)),
+        models.User.rating: per_user(func.avg(reviews.rating)),
+    }
+    for rating in RATING_VALUES:
+        values[_bucket(rating)] = per_user(func.count(reviews.id), reviews.rating == rating)
+    db.execute(update(models.User).values(values).execution_options(synchronize_session=False))
@@ -0,0 +1,161 @@
+import re
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import insert
+
+import models
+import order_events
+import search_index
+from database import SessionLocal
+
+# Лимит сохраненных поисков на пользователя
+MAX_SAVED_SEARCHES = 20
+# Полная перезагрузка из БД: подхватывает поиски, сохраненные другими воркерами
+SAVED_SEARCH_RELOAD_SECONDS = 300
+
+
+class CompiledSearch(NamedTuple):
+    id: int
+    user_id: int
+    label: str
+    terms: Tuple[str, ...]
+    category: Optional[str]
+    min_budget: Optional[float]
+    max_budget: Optional[float]
+
+
+def compile_search(search: models.SavedSearch) -> CompiledSearch:
+    terms = tuple(dict.fromkeys(search_index.search_terms(search.query or "")))
+    label = search.query or search.category or "без условий"
+    return CompiledSearch(search.id, search.user_id, label, terms, search.category,
+                          search.min_budget, search.max_budget)
+
+
+def _order_prefixes(order: models.Order) -> Set[str]:
+    """Все префиксы слов заказа: термин поиска совпадает, если он - префикс слова (как в FTS5)"""
+    text = " ".join(filter(None, [order.title, order.description, order.requirements]))
+    prefixes = set()
+    for word in set(re.findall(r"\w+", text.lower())):
+        for end in range(1, len(word) + 1):
+            prefixes.add(word[:end])
+    return prefixes
+
+
+class SavedSearchIndex:
+    """
+    Инвертированный индекс сохраненных поисков. Каждый поиск хранится под одним
+    ключом - самым длинным (самым избирательным) термином, категорией или в списке
+    "любой заказ". Новый заказ проверяется только против поисков, ключи которых
+    встречаются в заказе, а не против всех сохраненных поисков.
+    """
+
+    def __init__(self, reload_interval: float = SAVED_SEARCH_RELOAD_SECONDS):
+        self.reload_interval = reload_interval
+        self._searches: Dict[int, CompiledSearch] = {}
+        self._by_term: Dict[str, Set[int]] = {}
+        self._by_category: Dict[str, Set[int]] = {}
+        self._match_all: Set[int] = set()
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def is_warm(self) -> bool:
+        return (self._loaded_at is not None
+                and time.monotonic() - self._loaded_at < self.reload_interval)
+
+    def load(self, db) -> None:
+        searches = db.query(models.SavedSearch).all()
+        with self._lock:
+            self._searches = {}
+            self._by_term = {}
+            self._by_category = {}
+            self._match_all = set()
+            for search in searches:
+                self._insert(compile_search(search))
+            self._loaded_at = time.monotonic()
+
+    def add(self, search: models.SavedSearch) -> None:
+        with self._lock:
+            self._remove(search.id)
+            self._insert(compile_search(search))
+
+    def remove(self, search_id: int) -> None:
+        with self._lock:
+            self._remove(search_id)
+
+    def _bucket(self, search: CompiledSearch) -> Set[int]:
+        if search.terms:
+            key = max(search.terms, key=len)
+            return self._by_term.setdefault(key, set())
+        if search.category:
+            return self._by_category.setdefault(search.category, set())
+        return self._match_all
+
+    def _insert(self, search: CompiledSearch) -> None:
+        self._searches[search.id] = search
+        self._bucket(search).add(search.id)
+
+    def _remove(self, search_id: int) -> None:
+        search = self._searches.pop(search_id, None)
+        if search is not None:
+            self._bucket(search).discard(search_id)
+
+    def match(self, order: models.Order) -> List[CompiledSearch]:
+        """Поиски, под которые подходит заказ; не больше одного на пользователя"""
+        prefixes = _order_prefixes(order)
+        with self._lock:
+            candidates = set(self._match_all)
+            for prefix in prefixes:
+                candidates |= self._by_term.get(prefix, set())
+            if order.category:
+                candidates |= self._by_category.get(order.category, set())
+            searches = [self._searches[search_id] for search_id in candidates]
+
+        matched: Dict[int, CompiledSearch] = {}
+        for search in sorted(searches, key=lambda s: s.id):
+            if search.user_id == order.client_id or search.user_id in matched:
+                continue
+            if not all(term in prefixes for term in search.terms):
+                continue
+            if search.category and search.category != order.category:
+                continue
+            if search.min_budget is not None and (order.budget is None or order.budget < search.min_budget):
+                continue
+            if search.max_budget is not None and (order.budget is None or order.budget > search.max_budget):
+                continue
+            matched[search.user_id] = search
+        return list(matched.values())
+
+
+saved_search_index = SavedSearchIndex()
+
+
+def notify_matches(order: models.Order) -> int:
+    """Уведомляет владельцев подходящих сохраненных поисков о новом заказе"""
+    db = SessionLocal()
+    try:
+        if not saved_search_index.is_warm():
+            saved_search_index.load(db)
+        matches = saved_search_index.match(order)
+        if not matches:
+            return 0
+        db.execute(insert(models.Notification), [
+            {
+                "user_id": search.user_id,
+                "title": "Новый заказ по сохраненному поиску",
+                "body": f"Заказ '{order.title}' за {order.budget} руб. подходит под поиск '{search.label}'",
+                "notification_type": "saved_search",
+                "related_id": order.id
+            }
+            for search in matches
+        ])
+        db.commit()
+        return len(matches)
+    finally:
+        db.close()
+
+
+@order_events.subscribe(order_events.ORDER_CREATED)
+def _match_saved_searches(event, order):
+    notify_matches(order)
@@ -0,0 +1,160 @@
+import re
+from typing import List, Optional
+
+from sqlalchemy import Column, Integer, MetaData, Table, func, literal_column, or_, text
+
+import models
+
+# Полнотекстовый индекс по заказам: title, description, requirements.
+# SQLite - внешняя FTS5-таблица orders_fts, синхронизируемая триггерами.
+# PostgreSQL - генерируемая колонка orders.search_vector (tsvector) с GIN-индексом.
+
+# Веса полей в ранжировании: заголовок важнее описания, описание важнее требований
+TITLE_WEIGHT, DESCRIPTION_WEIGHT, REQUIREMENTS_WEIGHT = 10.0, 5.0, 1.0
+
+orders_fts = Table("orders_fts", MetaData(), Column("rowid", Integer))
+
+_SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS orders_fts USING fts5(
+        title, description, requirements,
+        content='orders', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS orders_fts_ai AFTER INSERT ON orders BEGIN
+        INSERT INTO orders_fts(rowid, title, description, requirements)
+        VALUES (new.id, new.title, new.description, new.requirements);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS orders_fts_ad AFTER DELETE ON orders BEGIN
+        INSERT INTO orders_fts(orders_fts, rowid, title, description, requirements)
+        VALUES ('delete', old.id, old.title, old.description, old.requirements);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS orders_fts_au
+    AFTER UPDATE OF title, description, requirements ON orders BEGIN
+        INSERT INTO orders_fts(orders_fts, rowid, title, description, requirements)
+        VALUES ('delete', old.id, old.title, old.description, old.requirements);
+        INSERT INTO orders_fts(rowid, title, description, requirements)
+        VALUES (new.id, new.title, new.description, new.requirements);
+    END
+    """,
+]
+
+_POSTGRES_DDL = [
+    """
+    ALTER TABLE orders ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(description, '')), 'B') ||
+        setweight(to_tsvector('russian', coalesce(requirements, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_orders_search_vector ON orders USING GIN (search_vector)",
+]
+
+# Окончания для упрощенного стемминга русских слов (FTS5 не знает морфологии)
+_RU_ENDINGS = sorted([
+    "иями", "ями", "ами", "иях", "ого", "его", "ому", "ему", "ыми", "ими",
+    "ой", "ей", "ий", "ый", "ая", "яя", "ое", "ее", "ые", "ие", "ых", "их",
+    "ом", "ем", "ам", "ям", "ах", "ях", "ов", "ев", "ую", "юю",
+    "а", "я", "о", "е", "ы", "и", "у", "ю", "ь",
+], key=len, reverse=True)
+
+_enabled_dialect: Optional[str] = None
+
+
+def setup_search_index(engine, rebuild: bool = False) -> bool:
+    """Создает полнотекстовый индекс, если БД его поддерживает"""
+    global _enabled_dialect
+    dialect = engine.dialect.name
+    try:
+        with engine.begin() as conn:
+            if dialect == "sqlite":
+                exists = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'orders_fts'"
+                )).first()
+                for ddl in _SQLITE_DDL:
+                    conn.execute(text(ddl))
+                if rebuild or not exists:
+                    # Индексируем уже существующие заказы
+                    conn.execute(text("INSERT INTO orders_fts(orders_fts) VALUES ('rebuild')"))
+            elif dialect == "postgresql":
+                for ddl in _POSTGRES_DDL:
+                    conn.execute(text(ddl))
+            else:
+                return False
+    except Exception as e:
+        print(f"⚠️ Полнотекстовый поиск недоступен, используется ILIKE: {e}")
+        _enabled_dialect = None
+        return False
+
+    _enabled_dialect = dialect
+    print(f"🔍 Полнотекстовый индекс заказов готов ({dialect})")
+    return True
+
+
+def is_enabled() -> bool:
+    return _enabled_dialect is not None
+
+
+def _stem(word: str) -> str:
+    if len(word) <= 4:
+        return word
+    for ending in _RU_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+
+def search_terms(q: str) -> List[str]:
+    """Основы слов запроса в том виде, в каком они ищутся в индексе (по префиксу)"""
+    return [_stem(w) for w in re.findall(r"\w+", q.lower())]
+
+
+def build_fts5_query(q: str) -> Optional[str]:
+    """Превращает пользовательский ввод в безопасный запрос FTS5: все слова по префиксу основы"""
+    terms = search_terms(q)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def apply_substring_search(query, q: str):
+    """Поиск подстрокой (ILIKE) по названию и описанию - без полнотекстового индекса"""
+    return query.filter(or_(
+        models.Order.title.ilike(f"%{q}%"),
+        models.Order.description.ilike(f"%{q}%")
+    ))
+
+
+def apply_search(query, q: str):
+    """
+    Добавляет к запросу по заказам полнотекстовое условие.
+    Возвращает (query, rank) - rank тем больше, чем релевантнее заказ.
+    """
+    if not search_terms(q):
+        # В запросе нет слов (например, '"*') - индексу искать нечего, ищем подстроку как раньше
+        return apply_substring_search(query, q), None
+
+    if _enabled_dialect == "sqlite":
+        match = build_fts5_query(q)
+        rank = -func.bm25(
+            literal_column("orders_fts"), TITLE_WEIGHT, DESCRIPTION_WEIGHT, REQUIREMENTS_WEIGHT
+        )
+        query = query.join(orders_fts, orders_fts.c.rowid == models.Order.id).filter(
+            literal_column("orders_fts").op("MATCH")(match)
+        )
+        return query, rank
+
+    if _enabled_dialect == "postgresql":
+        search_vector = literal_column("orders.search_vector")
+        ts_query = func.websearch_to_tsquery("russian", q)
+        query = query.filter(search_vector.op("@@")(ts_query))
+        return query, func.ts_rank_cd(search_vector, ts_query)
+
+    return query, None
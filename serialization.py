@@ -0,0 +1,66 @@
+import json
+from datetime import date, datetime
+from functools import lru_cache
+from operator import attrgetter, itemgetter
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson - необязательная зависимость, без нее работает json
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Быстрая сериализация в JSON: orjson кодирует datetime сам, без jsonable_encoder"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def compile_serializer(fields: List[str], from_dict: bool = False) -> Callable[[Any], dict]:
+    """
+    Заранее собранный сериализатор строки БД в dict по списку полей схемы ответа.
+    Данные из БД уже корректны, поэтому повторная валидация Pydantic не нужна.
+    """
+    fields = list(fields)
+    getter = itemgetter(*fields) if from_dict else attrgetter(*fields)
+    if len(fields) == 1:
+        return lambda obj: {fields[0]: getter(obj)}
+    return lambda obj: dict(zip(fields, getter(obj)))
+
+
+@lru_cache(maxsize=256)
+def cached_serializer(fields: Tuple[str, ...], from_dict: bool = False) -> Callable[[Any], dict]:
+    """compile_serializer с кэшем - для наборов полей из параметра fields="""
+    return compile_serializer(list(fields), from_dict)
+
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> Optional[Tuple[str, ...]]:
+    """
+    Разбирает параметр fields=id,title,budget. None - вернуть все поля.
+    Порядок полей в ответе совпадает с порядком в схеме.
+    """
+    if fields is None:
+        return None
+    allowed = list(allowed)
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - set(allowed)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    if not requested:
+        raise ValueError("fields must not be empty")
+    return tuple(name for name in allowed if name in requested)
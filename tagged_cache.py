@@ -0,0 +1,447 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList
+
+# Кэш ответов и объектов с тегами "модель:id" (order:42, user:7) и "модель" (списки).
+# Теги сбрасываются автоматически после commit сессии, изменившей эти строки,
+# поэтому обработчики не пишут инвалидацию вручную.
+
+# Страховочный TTL: записи, изменившиеся в обход сессий SQLAlchemy, живут не дольше этого срока
+CACHE_TTL_SECONDS = 60
+CACHE_MAX_ENTRIES = 10000
+# Общий дисковый уровень для нескольких воркеров: путь к каталогу в VRABOTE_CACHE_DIR
+CACHE_DIR = os.environ.get("VRABOTE_CACHE_DIR")
+# Как часто воркер читает журнал инвалидаций других воркеров и сколько журнал хранится
+SHARED_SYNC_SECONDS = 1
+INVALIDATION_LOG_SECONDS = 600
+# Раз в столько инвалидаций из дискового уровня вычищаются просроченные записи и журнал
+DISK_PRUNE_EVERY = 100
+# Сколько последних инвалидированных тегов помнить для проверки set()
+MAX_TRACKED_TAGS = 10000
+# Опция выполнения для записей, которые не должны сбрасывать кэш (счетчики просмотров)
+SKIP_INVALIDATION = "skip_cache_invalidation"
+
+MISSING = object()
+
+
+def model_tag(model_name: str, object_id: Any = None) -> str:
+    return model_name if object_id is None else f"{model_name}:{object_id}"
+
+
+def _wildcard(model_name: str) -> str:
+    return f"{model_name}:*"
+
+
+class DiskTier:
+    """
+    Общий для процессов уровень кэша в отдельном файле SQLite. Инвалидации пишутся
+    в журнал cache_invalidations: по нему воркеры сбрасывают свои копии в памяти.
+    """
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "cache.db")
+        self._local = threading.local()
+        self._invalidations = 0
+        conn = self._connect()
+        # WAL сохраняется в файле; воркеры, стартующие одновременно, включают его по очереди
+        for attempt in range(5):
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                break
+            except sqlite3.OperationalError:
+                time.sleep(0.1 * (attempt + 1))
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_tags ("
+            "tag TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (tag, key))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_invalidations ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, tag TEXT NOT NULL, invalidated_at REAL NOT NULL)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def last_seq(self) -> int:
+        row = self._connect().execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'cache_invalidations'"
+        ).fetchone()
+        return row[0] if row else 0
+
+    def invalidations_since(self, seq: int) -> Tuple[List[Tuple[int, str]], bool]:
+        """Инвалидации после seq и признак полноты (False - часть журнала уже вычищена)"""
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT seq, tag FROM cache_invalidations WHERE seq > ? ORDER BY seq", (seq,)
+        ).fetchall()
+        if rows:
+            return rows, rows[0][0] == seq + 1
+        return rows, self.last_seq() <= seq
+
+    def get(self, key: str) -> Any:
+        row = self._connect().execute(
+            "SELECT value, expires_at FROM cache_entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] <= time.time():
+            return MISSING
+        return pickle.loads(row[0])
+
+    def set(self, key: str, value: Any, tags: Tuple[str, ...], ttl: float,
+            since_seq: Optional[int] = None) -> bool:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Тег записи инвалидирован (в любом воркере) после начала построения - не сохраняем
+            if since_seq is not None and tags:
+                placeholders = ",".join("?" * len(tags))
+                changed = conn.execute(
+                    f"SELECT 1 FROM cache_invalidations WHERE seq > ? AND tag IN ({placeholders}) LIMIT 1",
+                    (since_seq, *tags)
+                ).fetchone()
+                if changed:
+                    conn.execute("ROLLBACK")
+                    return False
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, pickle.dumps(value), time.time() + ttl)
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO cache_tags (tag, key) VALUES (?, ?)",
+                [(tag, key) for tag in tags]
+            )
+            conn.execute("COMMIT")
+            return True
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def invalidate(self, tags: Iterable[str]) -> List[int]:
+        """Удаляет записи с этими тегами и пишет их в журнал; возвращает номера записей журнала"""
+        tags = list(tags)
+        placeholders = ",".join("?" * len(tags))
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            seqs = [
+                conn.execute(
+                    "INSERT INTO cache_invalidations (tag, invalidated_at) VALUES (?, ?)", (tag, now)
+                ).lastrowid
+                for tag in tags
+            ]
+            conn.execute(
+                f"DELETE FROM cache_entries WHERE key IN "
+                f"(SELECT key FROM cache_tags WHERE tag IN ({placeholders}))", tags
+            )
+            conn.execute(f"DELETE FROM cache_tags WHERE tag IN ({placeholders})", tags)
+            self._invalidations += 1
+            if self._invalidations % DISK_PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+                conn.execute("DELETE FROM cache_tags WHERE key NOT IN (SELECT key FROM cache_entries)")
+                conn.execute(
+                    "DELETE FROM cache_invalidations WHERE invalidated_at <= ?",
+                    (now - INVALIDATION_LOG_SECONDS,)
+                )
+            conn.execute("COMMIT")
+            return seqs
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class TaggedCache:
+    """
+    LRU в памяти процесса (+ необязательный дисковый уровень). Запись с тегом
+    "order:42" сбрасывается изменением заказа 42, с тегом "order" - любым
+    изменением набора заказов.
+    """
+
+    def __init__(self, ttl: float = CACHE_TTL_SECONDS, max_entries: int = CACHE_MAX_ENTRIES,
+                 directory: Optional[str] = CACHE_DIR):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any, Tuple[str, ...]]]" = OrderedDict()
+        self._keys_by_tag: Dict[str, Set[str]] = {}
+        # Логические часы инвалидаций: тег -> момент его последнего сброса
+        self._clock = 0
+        self._invalidated_at: "OrderedDict[str, int]" = OrderedDict()
+        self._forgotten_at = 0
+        self._lock = threading.Lock()
+
+        self.shared = None
+        self._synced_seq = 0
+        self._synced_at = 0.0
+        self._own_seqs: Set[int] = set()
+        self._sync_lock = threading.Lock()
+        if directory:
+            try:
+                self.shared = DiskTier(directory)
+                self._synced_seq = self.shared.last_seq()
+            except (OSError, sqlite3.Error) as e:
+                self.shared = None
+                print(f"Cache disk tier disabled: {e}")
+
+    def generation(self) -> Tuple[int, int]:
+        """
+        Снимок перед построением значения: set() с этим снимком не сохраняет значение,
+        если один из его тегов сбросили после снимка
+        """
+        self._sync()
+        return self._clock, self._synced_seq
+
+    def get(self, key: str) -> Any:
+        self._sync()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    return entry[1]
+                self._drop(key)
+        if self.shared is None:
+            return MISSING
+        clock = self._clock
+        try:
+            stored = self.shared.get(key)
+        except sqlite3.Error as e:
+            print(f"Cache disk tier error: {e}")
+            return MISSING
+        if stored is MISSING:
+            return MISSING
+        value, tags = stored
+        with self._lock:
+            if not self._changed_since(tags, clock):
+                self._store(key, value, tags)
+        return value
+
+    def set(self, key: str, value: Any, tags: Iterable[str],
+            generation: Optional[Tuple[int, int]] = None) -> None:
+        tags = tuple(self._expand(tags))
+        clock, seq = generation or (None, None)
+        with self._lock:
+            # Пока значение строилось, данные могли измениться - такое не сохраняем
+            if clock is not None and self._changed_since(tags, clock):
+                return
+        if self.shared is not None:
+            try:
+                if not self.shared.set(key, (value, tags), tags, self.ttl, seq):
+                    return
+            except sqlite3.Error as e:
+                print(f"Cache disk tier error: {e}")
+                return
+        with self._lock:
+            if clock is not None and self._changed_since(tags, clock):
+                return
+            self._store(key, value, tags)
+
+    def invalidate_tags(self, tags: Iterable[str]) -> None:
+        tags = set(tags)
+        if not tags:
+            return
+        with self._lock:
+            self._invalidate_local(tags)
+        if self.shared is not None:
+            try:
+                seqs = self.shared.invalidate(tags)
+            except sqlite3.Error as e:
+                print(f"Cache disk tier error: {e}")
+                return
+            with self._lock:
+                self._own_seqs.update(seqs)
+
+    def _sync(self) -> None:
+        """Не чаще раза в SHARED_SYNC_SECONDS применяет инвалидации других воркеров"""
+        if self.shared is None or time.monotonic() - self._synced_at < SHARED_SYNC_SECONDS:
+            return
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            self._synced_at = time.monotonic()
+            try:
+                rows, complete = self.shared.invalidations_since(self._synced_seq)
+            except sqlite3.Error as e:
+                print(f"Cache disk tier error: {e}")
+                return
+            with self._lock:
+                if not complete:
+                    # Воркер долго не синхронизировался и журнал успели вычистить
+                    self._clock += 1
+                    self._forgotten_at = self._clock
+                    self._entries.clear()
+                    self._keys_by_tag.clear()
+                remote = set()
+                for seq, tag in rows:
+                    if seq in self._own_seqs:
+                        self._own_seqs.discard(seq)
+                    else:
+                        remote.add(tag)
+                if remote:
+                    self._invalidate_local(remote)
+                if rows:
+                    self._synced_seq = rows[-1][0]
+        finally:
+            self._sync_lock.release()
+
+    def _invalidate_local(self, tags: Set[str]) -> None:
+        self._clock += 1
+        for tag in tags:
+            self._invalidated_at[tag] = self._clock
+            self._invalidated_at.move_to_end(tag)
+            for key in list(self._keys_by_tag.get(tag, ())):
+                self._drop(key)
+        while len(self._invalidated_at) > MAX_TRACKED_TAGS:
+            _, forgotten = self._invalidated_at.popitem(last=False)
+            self._forgotten_at = max(self._forgotten_at, forgotten)
+
+    def _changed_since(self, tags: Iterable[str], clock: int) -> bool:
+        return any(self._invalidated_at.get(tag, self._forgotten_at) > clock for tag in tags)
+
+    @staticmethod
+    def _expand(tags: Iterable[str]) -> List[str]:
+        # Каждая запись "order:42" также числится под "order:*" - его сбрасывают
+        # массовые UPDATE, для которых неизвестно, какие строки изменились
+        expanded = []
+        for tag in tags:
+            expanded.append(tag)
+            model_name, _, object_id = tag.partition(":")
+            if object_id and object_id != "*":
+                expanded.append(_wildcard(model_name))
+        return list(dict.fromkeys(expanded))
+
+    def _store(self, key: str, value: Any, tags: Tuple[str, ...]) -> None:
+        self._drop(key)
+        self._entries[key] = (time.monotonic() + self.ttl, value, tags)
+        for tag in tags:
+            self._keys_by_tag.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+
+cache = TaggedCache()
+
+
+# --- Автоматическая инвалидация по событиям сессии SQLAlchemy ---
+
+def _model_name(table_name: str, mapped: Dict[str, str]) -> str:
+    return mapped.get(table_name, table_name)
+
+
+def _is_column(element, table_name: str, column_name: str) -> bool:
+    table = getattr(element, "table", None)
+    return getattr(element, "key", None) == column_name and getattr(table, "name", None) == table_name
+
+
+def _ids_from_where(whereclause, table_name: str, pk_name: str, parameters) -> Optional[Set[Any]]:
+    """id из условия вида "id = :x" (в том числе внутри AND); None - если строки неизвестны"""
+    if whereclause is None:
+        # Массовый ORM UPDATE по первичному ключу: update(Model) со списком словарей
+        if isinstance(parameters, list) and parameters and all(pk_name in params for params in parameters):
+            return {params[pk_name] for params in parameters}
+        return None
+    if isinstance(whereclause, BooleanClauseList) and whereclause.operator is operators.and_:
+        for clause in whereclause.clauses:
+            ids = _ids_from_where(clause, table_name, pk_name, parameters)
+            if ids is not None:
+                return ids
+        return None
+    if not isinstance(whereclause, BinaryExpression) or whereclause.operator is not operators.eq:
+        return None
+    left, right = whereclause.left, whereclause.right
+    if _is_column(right, table_name, pk_name):
+        left, right = right, left
+    if not _is_column(left, table_name, pk_name) or not isinstance(right, BindParameter):
+        return None
+    if isinstance(parameters, list):
+        # executemany: значения id берем из каждого набора параметров
+        if parameters and all(right.key in params for params in parameters):
+            return {params[right.key] for params in parameters}
+        return None
+    if isinstance(parameters, dict) and right.key in parameters:
+        return {parameters[right.key]}
+    return {right.value} if right.value is not None else None
+
+
+def install(session_factory, base) -> None:
+    """Подписывает кэш на события сессий: после commit сбрасываются теги измененных строк"""
+    mapped = {
+        mapper.local_table.name: mapper.class_.__name__.lower()
+        for mapper in base.registry.mappers
+    }
+
+    def pending(session) -> Set[str]:
+        return session.info.setdefault("cache_tags", set())
+
+    @event.listens_for(session_factory, "after_flush")
+    def _collect_flushed(session, flush_context):
+        tags = pending(session)
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            table = getattr(type(obj), "__tablename__", None)
+            if table is None:
+                continue
+            model_name = _model_name(table, mapped)
+            tags.add(model_tag(model_name))
+            identity = getattr(obj, "id", None)
+            if identity is not None:
+                tags.add(model_tag(model_name, identity))
+
+    @event.listens_for(session_factory, "do_orm_execute")
+    def _collect_statement(orm_execute_state):
+        if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+            return
+        if orm_execute_state.execution_options.get(SKIP_INVALIDATION):
+            return
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is None or not hasattr(table, "name"):
+            return
+        model_name = _model_name(table.name, mapped)
+        tags = pending(orm_execute_state.session)
+        tags.add(model_tag(model_name))
+        if orm_execute_state.is_insert:
+            return
+        pk = list(table.primary_key.columns)
+        ids = None
+        if len(pk) == 1:
+            ids = _ids_from_where(orm_execute_state.statement.whereclause, table.name,
+                                  pk[0].key, orm_execute_state.parameters)
+        if ids is None:
+            tags.add(_wildcard(model_name))
+        else:
+            tags.update(model_tag(model_name, object_id) for object_id in ids)
+
+    @event.listens_for(session_factory, "after_commit")
+    def _invalidate_committed(session):
+        tags = session.info.pop("cache_tags", None)
+        if tags:
+            cache.invalidate_tags(tags)
+
+    @event.listens_for(session_factory, "after_rollback")
+    def _discard_rolled_back(session):
+        session.info.pop("cache_tags", None)
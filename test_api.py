@@ -171,6 +171,109 @@ class TestOrderFullCycle:
         assert order["status"] == "completed", f"Ожидался статус 'completed', получен '{order['status']}'"
         print(f"✅ Заказ успешно завершен")
 
+# === 4. ТЕСТЫ BATCH-ЗАПРОСОВ ===
+class TestBatch:
+    def test_users_batch(self, test_user_client, test_user_freelancer):
+        """Несколько профилей одним запросом, результат по id."""
+        client = requests.post(f"{BASE_URL}/register", json=test_user_client).json()
+        freelancer = requests.post(f"{BASE_URL}/register", json=test_user_freelancer).json()
+        response = requests.get(f"{BASE_URL}/users/batch", params={"ids": f"{client['id']},{freelancer['id']},999999999"})
+        assert response.status_code == 200
+        data = response.json()
+        assert set(data.keys()) == {str(client["id"]), str(freelancer["id"])}
+        assert data[str(freelancer["id"])]["is_freelancer"] is True
+        print("✅ Batch профилей работает")
+
+    def test_batch_rejects_bad_ids(self):
+        """Некорректный список id отклоняется."""
+        response = requests.get(f"{BASE_URL}/orders/batch", params={"ids": "1,abc"})
+        assert response.status_code == 400
+
+    def test_bad_cursor_rejected(self, test_user_freelancer):
+        """Поддельный курсор (строка вместо даты, лишние значения) - 400, а не 500."""
+        import base64, json
+        requests.post(f"{BASE_URL}/register", json=test_user_freelancer)
+        token = requests.post(f"{BASE_URL}/token", data={'username': test_user_freelancer['email'], 'password': test_user_freelancer['password']}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        def cursor(values):
+            return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+        for bad in [cursor(["x", 1]), cursor([{"dt": "2024-01-01T00:00:00"}, "1"]), cursor([1, 2, 3]), "!!!"]:
+            for path in ["/orders", "/my-orders", "/my-bids", "/users/1/reviews", "/orders/urgent"]:
+                response = requests.get(f"{BASE_URL}{path}", params={"cursor": bad}, headers=headers)
+                assert response.status_code == 400, f"{path}: {response.status_code}"
+
+# === 5. ТЕСТЫ СОХРАНЕННЫХ ПОИСКОВ ===
+class TestSavedSearches:
+    def test_new_order_notifies_matching_search(self, test_user_client, test_user_freelancer):
+        """Новый заказ приходит уведомлением только под подходящий сохраненный поиск."""
+        requests.post(f"{BASE_URL}/register", json=test_user_client)
+        requests.post(f"{BASE_URL}/register", json=test_user_freelancer)
+        client_token = requests.post(f"{BASE_URL}/token", data={'username': test_user_client['email'], 'password': test_user_client['password']}).json()["access_token"]
+        freelancer_token = requests.post(f"{BASE_URL}/token", data={'username': test_user_freelancer['email'], 'password': test_user_freelancer['password']}).json()["access_token"]
+        client_headers = {"Authorization": f"Bearer {client_token}"}
+        freelancer_headers = {"Authorization": f"Bearer {freelancer_token}"}
+
+        word = f"сохран{int(datetime.now().timestamp() * 1000)}"
+        response = requests.post(f"{BASE_URL}/saved-searches", json={"query": word, "max_budget": 3000}, headers=freelancer_headers)
+        assert response.status_code == 200
+
+        order_data = {"title": f"Заказ {word}", "description": "Описание", "requirements": "Нет", "budget": 2000.0}
+        requests.post(f"{BASE_URL}/orders", json=order_data, headers=client_headers)
+        requests.post(f"{BASE_URL}/orders", json=dict(order_data, budget=9000.0), headers=client_headers)
+
+        notifications = requests.get(f"{BASE_URL}/notifications", headers=freelancer_headers).json()
+        matched = [n for n in notifications if n["notification_type"] == "saved_search" and word in n["body"]]
+        assert len(matched) == 1
+        print("✅ Сохраненный поиск сработал")
+
+# === 6. ТЕСТЫ IDEMPOTENCY-KEY ===
+class TestIdempotency:
+    def test_retry_replays_response(self, test_user_client):
+        """Повтор POST с тем же ключом не создает второй заказ."""
+        requests.post(f"{BASE_URL}/register", json=test_user_client)
+        token = requests.post(f"{BASE_URL}/token", data={'username': test_user_client['email'], 'password': test_user_client['password']}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}", "Idempotency-Key": f"retry-{datetime.now().timestamp()}"}
+        order_data = {"title": "Повтор по таймауту", "description": "Описание", "requirements": "Нет", "budget": 1000.0}
+
+        first = requests.post(f"{BASE_URL}/orders", json=order_data, headers=headers)
+        second = requests.post(f"{BASE_URL}/orders", json=order_data, headers=headers)
+        assert first.status_code == 200
+        assert second.status_code == 200
+        assert second.json()["id"] == first.json()["id"]
+        assert second.headers.get("Idempotent-Replayed") == "true"
+
+        # Тот же ключ с другим телом запроса - ошибка
+        changed = requests.post(f"{BASE_URL}/orders", json=dict(order_data, budget=2000.0), headers=headers)
+        assert changed.status_code == 422
+
+# === 7. ТЕСТЫ СЧЕТЧИКОВ ПРОСМОТРОВ ===
+class TestCounters:
+    def test_flush_keeps_updated_at(self, test_user_client):
+        """Запись счетчиков в БД не меняет версию заказа (updated_at)."""
+        import models
+        from database import SessionLocal
+        from order_counters import OrderCounterBuffer
+
+        requests.post(f"{BASE_URL}/register", json=test_user_client)
+        token = requests.post(f"{BASE_URL}/token", data={'username': test_user_client['email'], 'password': test_user_client['password']}).json()["access_token"]
+        order_data = {"title": "Счетчики", "description": "Описание", "requirements": "Нет", "budget": 1000.0}
+        order_id = requests.post(f"{BASE_URL}/orders", json=order_data, headers={"Authorization": f"Bearer {token}"}).json()["id"]
+
+        db = SessionLocal()
+        try:
+            before = db.query(models.Order.updated_at, models.Order.view_count).filter(models.Order.id == order_id).one()
+            buffer = OrderCounterBuffer()
+            buffer.add_view(order_id)
+            assert buffer.flush() == 1
+            db.expire_all()
+            after = db.query(models.Order.updated_at, models.Order.view_count).filter(models.Order.id == order_id).one()
+        finally:
+            db.close()
+        assert after.view_count == before.view_count + 1
+        assert after.updated_at == before.updated_at
+
 # === ЗАПУСК ВСЕХ ТЕСТОВ ===
 if __name__ == "__main__":
     # Запуск с детальным выводом и игнорированием предупреждек
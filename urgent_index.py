@@ -0,0 +1,123 @@
+import bisect
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import models
+import order_events
+
+URGENT_WINDOW = timedelta(hours=24)
+# Полная перезагрузка из БД: подхватывает изменения, сделанные другими воркерами
+URGENT_INDEX_RELOAD_SECONDS = 300
+
+
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _snapshot(order: models.Order) -> dict:
+    return {column.name: getattr(order, column.name) for column in models.Order.__table__.columns}
+
+
+class UrgentOrderIndex:
+    """
+    Открытые заказы с дедлайном в будущем, отсортированные по (deadline, id).
+    Поддерживается событиями жизненного цикла заказа, /orders/urgent
+    отдается из памяти без запроса к БД.
+    """
+
+    def __init__(self, window: timedelta = URGENT_WINDOW,
+                 reload_interval: float = URGENT_INDEX_RELOAD_SECONDS):
+        self.window = window
+        self.reload_interval = reload_interval
+        self._keys: List[Tuple[datetime, int]] = []
+        self._orders: Dict[int, Tuple[Tuple[datetime, int], dict]] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def is_warm(self) -> bool:
+        return (self._loaded_at is not None
+                and time.monotonic() - self._loaded_at < self.reload_interval)
+
+    def load(self, db) -> None:
+        """Холодный старт: читаем открытые заказы с будущим дедлайном из БД"""
+        orders = db.query(models.Order).filter(
+            models.Order.status == "open",
+            models.Order.deadline > datetime.utcnow()
+        ).all()
+        with self._lock:
+            self._keys = []
+            self._orders = {}
+            for order in orders:
+                self._insert(order)
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+
+    def add(self, order: models.Order) -> None:
+        with self._lock:
+            self._remove(order.id)
+            if order.status == "open" and order.deadline is not None:
+                self._insert(order)
+
+    def remove(self, order_id: int) -> None:
+        with self._lock:
+            self._remove(order_id)
+
+    def _insert(self, order: models.Order) -> None:
+        key = (_naive_utc(order.deadline), order.id)
+        bisect.insort(self._keys, key)
+        self._orders[order.id] = (key, _snapshot(order))
+
+    def _remove(self, order_id: int) -> None:
+        entry = self._orders.pop(order_id, None)
+        if entry is None:
+            return
+        position = bisect.bisect_left(self._keys, entry[0])
+        if position < len(self._keys) and self._keys[position] == entry[0]:
+            del self._keys[position]
+
+    def urgent(self, now: datetime, after: Optional[Tuple[datetime, int]] = None) -> List[dict]:
+        """Заказы с дедлайном в (now, now + window] по возрастанию дедлайна"""
+        with self._lock:
+            # Дедлайны, которые уже прошли, больше не понадобятся
+            expired = bisect.bisect_right(self._keys, (now, float("inf")))
+            for key in self._keys[:expired]:
+                self._orders.pop(key[1], None)
+            del self._keys[:expired]
+
+            start = 0 if after is None else bisect.bisect_right(self._keys, after)
+            end = bisect.bisect_right(self._keys, (now + self.window, float("inf")))
+            return [self._orders[key[1]][1] for key in self._keys[start:end]]
+
+
+urgent_index = UrgentOrderIndex()
+
+
+@order_events.subscribe(
+    order_events.ORDER_CREATED,
+    order_events.ORDER_PROMOTED,
+    order_events.ORDER_BID_PLACED,
+)
+def _add_to_urgent_index(event, order):
+    urgent_index.add(order)
+
+
+@order_events.subscribe(
+    order_events.ORDER_ACCEPTED,
+    order_events.ORDER_COMPLETED,
+    order_events.ORDER_CANCELLED,
+)
+def _remove_from_urgent_index(event, order):
+    urgent_index.remove(order.id)
+
+
+@order_events.subscribe(order_events.ORDER_DEMOTED)
+def _reload_urgent_index(event, order):
+    # Массовое снятие продвижений меняет снимки заказов - перечитаем при следующем запросе
+    urgent_index.invalidate()
@@ -0,0 +1,67 @@
+from sqlalchemy import case, func, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+import models
+
+# Счетчики /stats хранятся в user_stats. Строка создается при первом чтении
+# из одного агрегирующего запроса, дальше ее обновляют переходы статусов.
+# Пока строки нет, bump() ничего не делает - первый расчет все равно учтет эти изменения
+
+
+def bump(db, user_id: int, **deltas) -> None:
+    """Изменяет счетчики пользователя в текущей транзакции: bump(db, id, total_bids=1)"""
+    if user_id is None:
+        return
+    stats = models.UserStats
+    db.execute(
+        update(stats)
+        .where(stats.user_id == user_id)
+        .values({getattr(stats, name): getattr(stats, name) + delta for name, delta in deltas.items()})
+        .execution_options(synchronize_session=False)
+    )
+
+
+def compute(db, user_id: int) -> dict:
+    """Все счетчики одним запросом по заказам и откликам пользователя"""
+    order = models.Order
+    bid = models.Bid
+    as_client = order.client_id == user_id
+    as_freelancer = order.freelancer_id == user_id
+    completed = order.status == "completed"
+
+    def total(condition, value=1):
+        return func.coalesce(func.sum(case((condition, value), else_=0)), 0)
+
+    bids = select(
+        func.count(bid.id)
+    ).where(bid.freelancer_id == user_id).scalar_subquery()
+    accepted = select(
+        func.count(bid.id)
+    ).where(bid.freelancer_id == user_id, bid.status == "accepted").scalar_subquery()
+
+    row = db.execute(
+        select(
+            bids.label("total_bids"),
+            accepted.label("accepted_bids"),
+            total(as_freelancer & completed).label("freelancer_completed_orders"),
+            total(as_freelancer & completed, func.coalesce(order.budget, 0)).label("total_earnings"),
+            total(as_client & (order.status != "cancelled")).label("total_orders"),
+            total(as_client & completed).label("client_completed_orders"),
+            total(as_client & completed, func.coalesce(order.budget, 0)).label("total_spent"),
+        ).where(or_(as_client, as_freelancer))
+    ).one()
+    return dict(row._mapping)
+
+
+def get(db, user_id: int) -> dict:
+    """Счетчики пользователя: из user_stats, при первом обращении - расчет и сохранение"""
+    stats = db.get(models.UserStats, user_id)
+    if stats is not None:
+        return {column.name: getattr(stats, column.name) for column in models.UserStats.__table__.columns}
+
+    values = compute(db, user_id)
+    dialect = db.get_bind().dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    db.execute(insert(models.UserStats.__table__).values(user_id=user_id, **values).on_conflict_do_nothing())
+    db.commit()
+    return dict(values, user_id=user_id)